@@ -0,0 +1,289 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    analytics.py
+# @Time:        2025/2/15 16:24
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+直播间实时统计：每秒点赞、聊天、礼物数，每分钟进场人数，在线人数趋势。
+作为sink接入，滑动窗口由按时间分桶的环形数组实现，每个事件的更新都是O(1)，
+不保存事件本身，可同时统计上百个直播间：
+    analytics = AnalyticsSink(window=60, rollup_interval=60, sinks=[ConsoleSink()])
+    DouyinLiveWebFetcher(live_id, sinks=[ConsoleSink(), analytics]).start()
+    analytics.snapshot(live_id)
+"""
+
+import threading
+import time
+
+from events import (ChatEvent, ControlEvent, EmojiChatEvent, GiftEvent, LikeEvent, MemberEvent, RoomRollupEvent,
+                    RoomUserSeqEvent, SocialEvent)
+from sinks import Sink
+
+# 计数类统计
+COUNTERS = ('chats', 'likes', 'gifts', 'members', 'follows')
+
+# 事件类型 -> (计数下标, 计数值)
+_COUNTED_EVENTS = {
+    ChatEvent: (0, None),
+    EmojiChatEvent: (0, None),
+    LikeEvent: (1, 'count'),
+    GiftEvent: (2, None),
+    MemberEvent: (3, None),
+    SocialEvent: (4, None),
+}
+
+
+class RingCounter:
+    """
+    滑动窗口计数：窗口按bucket_seconds分桶放在环形数组中，并维护窗口内总和，
+    时间前进时清空过期的桶，摊还O(1)
+    """
+    __slots__ = ('bucket_seconds', 'counts', 'head', 'total')
+
+    def __init__(self, window=60, bucket_seconds=1):
+        self.bucket_seconds = bucket_seconds
+        self.counts = [0] * max(1, int(round(window / bucket_seconds)))
+        self.head = 0
+        self.total = 0
+
+    def _advance(self, epoch):
+        head = self.head
+        if epoch <= head:
+            return
+        counts = self.counts
+        size = len(counts)
+        if epoch - head >= size:
+            for i in range(size):
+                counts[i] = 0
+            self.total = 0
+        else:
+            for step in range(head + 1, epoch + 1):
+                index = step % size
+                self.total -= counts[index]
+                counts[index] = 0
+        self.head = epoch
+
+    def add(self, value, now):
+        epoch = int(now // self.bucket_seconds)
+        self._advance(epoch)
+        # 迟到的事件计入当前桶
+        self.counts[self.head % len(self.counts)] += value
+        self.total += value
+
+    def sum(self, now):
+        self._advance(int(now // self.bucket_seconds))
+        return self.total
+
+
+class RingGauge:
+    """
+    滑动窗口内的取值序列，每个桶保存最后一次的值，用于计算趋势
+    """
+    __slots__ = ('bucket_seconds', 'values', 'head', 'latest')
+
+    def __init__(self, window=60, bucket_seconds=1):
+        self.bucket_seconds = bucket_seconds
+        self.values = [None] * max(1, int(round(window / bucket_seconds)))
+        self.head = 0
+        self.latest = None
+
+    def _advance(self, epoch):
+        head = self.head
+        if epoch <= head:
+            return
+        values = self.values
+        size = len(values)
+        for step in range(head + 1, head + 1 + min(epoch - head, size)):
+            values[step % size] = None
+        self.head = epoch
+
+    def set(self, value, now):
+        self._advance(int(now // self.bucket_seconds))
+        self.values[self.head % len(self.values)] = value
+        self.latest = value
+
+    def trend(self, now):
+        """
+        :return: (窗口内最早的值, 最新的值, 最大值)，窗口内没有数据时为(None, latest, None)
+        """
+        self._advance(int(now // self.bucket_seconds))
+        values = self.values
+        size = len(values)
+        first = peak = None
+        for step in range(self.head + 1, self.head + 1 + size):
+            value = values[step % size]
+            if value is None:
+                continue
+            if first is None:
+                first = value
+            if peak is None or value > peak:
+                peak = value
+        return first, self.latest, peak
+
+
+class RoomStats:
+    """
+    单个直播间的统计状态
+    """
+    __slots__ = ('live_id', 'counters', 'viewers', 'tumbling', 'totals', 'window_start', 'window_viewers',
+                 'last_event')
+
+    def __init__(self, live_id, window, bucket_seconds, now):
+        self.live_id = live_id
+        self.counters = [RingCounter(window, bucket_seconds) for _ in COUNTERS]
+        self.viewers = RingGauge(window, bucket_seconds)
+        # 当前汇总周期内的计数
+        self.tumbling = [0] * len(COUNTERS)
+        self.totals = [0] * len(COUNTERS)
+        self.window_start = now
+        self.window_viewers = None
+        self.last_event = now
+
+    def rollup(self, now):
+        latest = self.viewers.latest or 0
+        start_viewers = self.window_viewers if self.window_viewers is not None else latest
+        event = RoomRollupEvent(live_id=self.live_id, method='Rollup', create_time=int(now * 1000),
+                                window_start=self.window_start, window_seconds=now - self.window_start,
+                                viewers=latest, viewers_delta=latest - start_viewers,
+                                **dict(zip(COUNTERS, self.tumbling)))
+        self.tumbling = [0] * len(COUNTERS)
+        self.window_start = now
+        self.window_viewers = self.viewers.latest
+        return event
+
+
+class AnalyticsSink(Sink):
+
+    def __init__(self, window=60, bucket_seconds=1, rollup_interval=60, sinks=None, idle_timeout=600):
+        """
+        直播间实时统计
+        :param window: 滑动窗口长度（秒）
+        :param bucket_seconds: 窗口分桶粒度（秒）
+        :param rollup_interval: 汇总周期（秒），每个周期向sinks输出一个RoomRollupEvent，0或None不输出
+        :param sinks: 接收RoomRollupEvent的sink列表
+        :param idle_timeout: 超过该秒数没有事件的直播间不再统计
+        """
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.rollup_interval = rollup_interval
+        self.sinks = list(sinks or [])
+        self.idle_timeout = idle_timeout
+        self._rooms = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+        if rollup_interval:
+            self._thread = threading.Thread(target=self._rollupLoop, name='analytics-rollup', daemon=True)
+            self._thread.start()
+
+    def _room(self, live_id, now):
+        room = self._rooms.get(live_id)
+        if room is None:
+            room = self._rooms[live_id] = RoomStats(live_id, self.window, self.bucket_seconds, now)
+        return room
+
+    def emitBatch(self, events):
+        now = time.time()
+        ended = []
+        with self._lock:
+            for event in events:
+                counted = _COUNTED_EVENTS.get(type(event))
+                if counted is not None:
+                    index, attr = counted
+                    value = getattr(event, attr) if attr else 1
+                    room = self._room(event.live_id, now)
+                    room.counters[index].add(value, now)
+                    room.tumbling[index] += value
+                    room.totals[index] += value
+                    room.last_event = now
+                elif type(event) is RoomUserSeqEvent:
+                    room = self._room(event.live_id, now)
+                    room.viewers.set(event.current, now)
+                    if room.window_viewers is None:
+                        room.window_viewers = event.current
+                    room.last_event = now
+                elif type(event) is ControlEvent and event.status == 3:
+                    room = self._rooms.pop(event.live_id, None)
+                    if room is not None:
+                        ended.append(room.rollup(now))
+        if ended:
+            self._emitRollups(ended)
+
+    def snapshot(self, live_id, now=None):
+        """
+        :return: 滑动窗口内的各项速率与在线人数趋势，没有该直播间时返回None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            room = self._rooms.get(live_id)
+            if room is None:
+                return None
+            sums = [counter.sum(now) for counter in room.counters]
+            first, latest, peak = room.viewers.trend(now)
+            totals = list(room.totals)
+        window = self.window
+        chats, likes, gifts, members, follows = sums
+        return {
+            "live_id": live_id,
+            "window": window,
+            "chats_per_sec": chats / window,
+            "likes_per_sec": likes / window,
+            "gifts_per_sec": gifts / window,
+            "members_per_min": members * 60 / window,
+            "follows_per_min": follows * 60 / window,
+            "viewers": latest,
+            "viewers_peak": peak,
+            "viewers_trend": latest - first if first is not None and latest is not None else 0,
+            "totals": dict(zip(COUNTERS, totals)),
+        }
+
+    def snapshots(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            live_ids = list(self._rooms)
+        return {live_id: self.snapshot(live_id, now) for live_id in live_ids}
+
+    def rollup(self, now=None):
+        """
+        结束当前汇总周期，为每个直播间输出一个RoomRollupEvent
+        :return: 输出的事件列表
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for live_id in [live_id for live_id, room in self._rooms.items()
+                            if now - room.last_event >= self.idle_timeout]:
+                del self._rooms[live_id]
+            events = [room.rollup(now) for room in self._rooms.values()]
+        self._emitRollups(events)
+        return events
+
+    def remove(self, live_id):
+        with self._lock:
+            self._rooms.pop(live_id, None)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        for sink in self.sinks:
+            sink.close()
+
+    def _emitRollups(self, events):
+        if not events:
+            return
+        for sink in self.sinks:
+            try:
+                sink.emitBatch(events)
+            except Exception as err:
+                print("【X】Sink emit error: ", err)
+
+    def _rollupLoop(self):
+        while not self._closed.wait(self.rollup_interval):
+            self.rollup()
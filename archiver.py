@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    archiver.py
+# @Time:        2025/1/27 19:55
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+列式归档：聊天、礼物、点赞、进场事件按类别攒成列式批次，写入Parquet或Arrow IPC文件，
+按行数/时间滚动文件，之后可用duckdb、pandas、polars等直接查询。需要安装pyarrow：
+    pip install pyarrow
+"""
+
+import os
+import threading
+import time
+
+from events import ChatEvent, GiftEvent, LikeEvent, MemberEvent, SocialEvent
+from sinks import Sink
+
+# 所有归档文件共有的列
+_COMMON_COLUMNS = [
+    ('live_id', 'string'),
+    ('msg_id', 'uint64'),
+    ('create_time', 'timestamp'),
+    ('user_id', 'uint64'),
+    ('user_name', 'string'),
+]
+
+# 事件类型 -> (归档名称, 独有的列)
+ARCHIVE_SCHEMAS = {
+    ChatEvent: ('chat', [('content', 'string')]),
+    GiftEvent: ('gift', [('gift_id', 'uint64'), ('gift_name', 'string'), ('diamond_count', 'uint32'),
+                         ('combo_count', 'uint64'), ('repeat_count', 'uint64'), ('group_count', 'uint64'),
+                         ('group_id', 'uint64'), ('repeat_end', 'uint32')]),
+    LikeEvent: ('like', [('count', 'uint64'), ('total', 'uint64')]),
+    MemberEvent: ('member', [('gender', 'uint32')]),
+    SocialEvent: ('social', []),
+}
+
+
+def _importPyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("ArchiveSink requires pyarrow, install it with: pip install pyarrow")
+    return pyarrow
+
+
+class _ArchiveWriter:
+    """
+    单个事件类别的列缓存与文件写入
+    """
+
+    def __init__(self, sink, name, columns):
+        pa = sink.pa
+        self.sink = sink
+        self.name = name
+        self.columns = [column for column, _ in _COMMON_COLUMNS + columns]
+        types = {'string': pa.string(), 'uint64': pa.uint64(), 'uint32': pa.uint32(),
+                 'timestamp': pa.timestamp('ms')}
+        self.schema = pa.schema([(column, types[kind]) for column, kind in _COMMON_COLUMNS + columns])
+        self.buffer = {column: [] for column in self.columns}
+        self.rows = 0
+        self.writer = None
+        self.file_rows = 0
+        self.file_opened = 0
+        self.path = None
+
+    def append(self, event):
+        for column in self.columns:
+            self.buffer[column].append(getattr(event, column))
+        self.rows += 1
+
+    def flush(self):
+        if not self.rows:
+            return
+        pa = self.sink.pa
+        batch = pa.RecordBatch.from_arrays([pa.array(self.buffer[column], type=self.schema.field(column).type)
+                                            for column in self.columns], schema=self.schema)
+        self.buffer = {column: [] for column in self.columns}
+        self.rows = 0
+        if self.writer is not None and self._shouldRotate():
+            self.close()
+        if self.writer is None:
+            self._open()
+        if self.sink.format == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+        self.file_rows += batch.num_rows
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        # 写完后再改为正式文件名，查询时不会读到未写完的文件
+        os.replace(self.path + '.tmp', self.path)
+
+    def _shouldRotate(self):
+        return (self.file_rows >= self.sink.rotate_rows
+                or time.time() - self.file_opened >= self.sink.rotate_interval)
+
+    def _open(self):
+        pa = self.sink.pa
+        directory = os.path.join(self.sink.directory, self.name)
+        os.makedirs(directory, exist_ok=True)
+        self.file_opened = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.file_opened))
+        suffix = 'parquet' if self.sink.format == 'parquet' else 'arrow'
+        self.path = os.path.join(directory, f"{self.name}-{stamp}-{os.getpid()}-{self.sink._nextFileSeq()}.{suffix}")
+        if self.sink.format == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(self.path + '.tmp', self.schema, compression=self.sink.compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.sink.compression)
+            self.writer = pa.ipc.new_file(self.path + '.tmp', self.schema, options=options)
+        self.file_rows = 0
+
+
+class ArchiveSink(Sink):
+
+    def __init__(self, directory, format='parquet', compression='zstd', batch_rows=10000, flush_interval=5,
+                 rotate_rows=1000000, rotate_interval=3600):
+        """
+        列式归档sink
+        :param directory: 归档目录，各类事件分别写入 directory/chat、directory/gift 等子目录
+        :param format: 'parquet' 或 'arrow'（Arrow IPC文件）
+        :param compression: 压缩算法，parquet支持zstd/snappy/gzip等，arrow支持zstd/lz4，None不压缩
+        :param batch_rows: 每类事件攒满多少行写一次
+        :param flush_interval: 最长多少秒写一次
+        :param rotate_rows: 单个文件超过多少行后新建文件
+        :param rotate_interval: 单个文件最长写入多少秒后新建文件
+        """
+        if format not in ('parquet', 'arrow'):
+            raise ValueError(f"unknown archive format {format!r}, choose from 'parquet', 'arrow'")
+        self.pa = _importPyarrow()
+        self.directory = directory
+        self.format = format
+        self.compression = compression
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rotate_rows = rotate_rows
+        self.rotate_interval = rotate_interval
+        self._writers = {}
+        self._file_seq = 0
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flushLoop, name='archive-flush', daemon=True)
+        self._thread.start()
+
+    def emitBatch(self, events):
+        with self._lock:
+            for event in events:
+                writer = self._writers.get(type(event))
+                if writer is None:
+                    schema = ARCHIVE_SCHEMAS.get(type(event))
+                    if schema is None:
+                        continue
+                    writer = self._writers[type(event)] = _ArchiveWriter(self, *schema)
+                writer.append(event)
+                if writer.rows >= self.batch_rows:
+                    writer.flush()
+
+    def flush(self):
+        """
+        写出缓存的事件并结束当前文件（.tmp改为正式文件名），之后的事件写入新文件。
+        抓取对象stop()时会调用，已写出的数据随即可以查询
+        """
+        with self._lock:
+            for writer in self._writers.values():
+                writer.flush()
+                writer.close()
+            self._last_flush = time.time()
+
+    def _writeBuffered(self):
+        # 定时写出缓存的事件，文件保持打开，按rotate_rows/rotate_interval滚动
+        with self._lock:
+            for writer in self._writers.values():
+                writer.flush()
+            self._last_flush = time.time()
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        with self._lock:
+            for writer in self._writers.values():
+                writer.flush()
+                writer.close()
+
+    def _nextFileSeq(self):
+        self._file_seq += 1
+        return self._file_seq
+
+    def _flushLoop(self):
+        while not self._closed.wait(min(1, self.flush_interval)):
+            if time.time() - self._last_flush >= self.flush_interval:
+                try:
+                    self._writeBuffered()
+                except Exception as err:
+                    print("【X】Archive flush error: ", err)
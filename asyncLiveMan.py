@@ -0,0 +1,266 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    asyncLiveMan.py
+# @Time:        2025/1/15 20:46
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+import asyncio
+import time
+
+import aiohttp
+
+from frameDecoder import encodeAck, scanAck
+from liveMan import DouyinLiveWebFetcher
+from protobuf.douyin import PushFrame
+
+
+class AsyncDouyinLiveFetcher(DouyinLiveWebFetcher):
+
+    def __init__(self, live_id, heartbeat_interval=10, **kwargs):
+        """
+        基于asyncio的直播间弹幕抓取对象，多个直播间可共用一个事件循环
+        :param live_id: 直播间的直播id
+        :param heartbeat_interval: 心跳帧发送间隔（秒）
+        :param kwargs: sign_func、methods、decoder、sinks等，同DouyinLiveWebFetcher；
+                       不支持pipeline_workers，需要多核解析时使用supervisor.Supervisor
+        """
+        if kwargs.get('pipeline_workers'):
+            raise ValueError("pipeline_workers is not supported by AsyncDouyinLiveFetcher, "
+                             "use supervisor.Supervisor to decode on multiple cores")
+        super().__init__(live_id, **kwargs)
+        self.heartbeat_interval = heartbeat_interval
+        self.ws = None
+        self._loop = None
+        self._closing = False
+        self._wake = None
+
+    async def start(self, session=None, semaphore=None):
+        """
+        连接直播间并持续接收数据，直到连接关闭或直播结束
+        :param session: 共用的aiohttp.ClientSession，不传则自行创建
+        :param semaphore: 建连阶段（获取room_id、签名、握手）使用的asyncio.Semaphore，用于限制同时建连的直播间数
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if session is None:
+            async with aiohttp.ClientSession() as session:
+                return await self._run(session, semaphore)
+        return await self._run(session, semaphore)
+
+    async def _run(self, session, semaphore):
+        """
+        连接断开后按退避时间自动重连，直到调用stop()
+        """
+        while not self._closing:
+            self._received = False
+            await self._connectWebSocket(session, semaphore)
+            if self._closing or not self.reconnect:
+                return
+            delay = self._nextBackoff()
+            print(f"【!】WebSocket disconnected, reconnecting in {delay:.1f}s")
+            # stop()会立即结束等待
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """
+        关闭连接，可在事件循环内（如直播结束回调）或其他线程中调用
+        """
+        self._closing = True
+        self._stopped = True
+        self._closeOutputs()
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+            if self.ws is not None:
+                self._loop.create_task(self.ws.close())
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+            if self.ws is not None:
+                asyncio.run_coroutine_threadsafe(self.ws.close(), self._loop)
+
+    async def _connectWebSocket(self, session, semaphore=None):
+        """
+        连接抖音直播间websocket服务器，请求直播间数据
+        """
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            # ttwid、room_id的获取与签名都是阻塞调用，放到线程池中执行，避免卡住其他直播间
+            wss = await self._loop.run_in_executor(None, self._buildWssUrl)
+            if self._closing:
+                return
+            self._countConnect()
+            headers = {
+                "cookie": f"ttwid={self.ttwid}",
+                'user-agent': self.user_agent,
+            }
+            self.ws = await session.ws_connect(wss, headers=headers, autoping=True, max_msg_size=0)
+        except Exception as err:
+            self._wsOnError(None, err)
+            return
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        if self._closing:
+            await self.ws.close()
+            return
+        self._wsOnOpen(self.ws)
+        heartbeat = self._loop.create_task(self._heartbeat(self.ws))
+        try:
+            async for msg in self.ws:
+                if msg.type == aiohttp.WSMsgType.BINARY:
+                    # 与websocket-client的回调一致，单帧处理出错只记录，不中断连接
+                    try:
+                        await self._wsOnMessage(self.ws, msg.data)
+                    except Exception as err:
+                        self._wsOnError(self.ws, err)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    self._wsOnError(self.ws, self.ws.exception())
+                    break
+        finally:
+            heartbeat.cancel()
+            await self.ws.close()
+            self._wsOnClose(self.ws)
+
+    async def _heartbeat(self, ws):
+        """
+        定时发送心跳帧
+        """
+        hb = PushFrame(payload_type='hb').SerializeToString()
+        while not ws.closed:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await ws.send_bytes(hb)
+            except Exception:
+                return
+
+    async def _wsOnMessage(self, ws, message):
+        """
+        接收到数据
+        :param ws: websocket实例
+        :param message: 数据
+        """
+        arrival, package = self._receiveFrame(message)
+        data = self._decompress(package.payload)
+
+        # 先回复ack再完整扫描消息
+        need_ack, internal_ext = scanAck(data)
+        if need_ack:
+            await self._sendAck(ws, package.log_id, internal_ext)
+
+        self._processResponse(self._scanResponse(data), arrival)
+
+    async def _sendAck(self, ws, log_id, internal_ext):
+        if self.metrics is None:
+            await ws.send_bytes(encodeAck(log_id, internal_ext))
+            return
+        start = time.perf_counter()
+        await ws.send_bytes(encodeAck(log_id, internal_ext))
+        self.metrics.ack_seconds.observe(time.perf_counter() - start)
+
+
+class RoomPool:
+
+    def __init__(self, live_ids=(), sign_func=None, max_connecting=10, fetcher_cls=AsyncDouyinLiveFetcher,
+                 **fetcher_kwargs):
+        """
+        在一个事件循环上同时抓取多个直播间
+        :param live_ids: 初始的直播间id列表
+        :param sign_func: wss链接签名函数，所有直播间共用
+        :param max_connecting: 同时进行建连（获取room_id、签名、握手）的直播间上限
+        :param fetcher_cls: 抓取对象类，可传入AsyncDouyinLiveFetcher的子类以自定义消息处理
+        :param fetcher_kwargs: 传给每个抓取对象的其他参数，如decoder、sinks；ingest需传入工厂函数，每个直播间各用一个队列
+        """
+        self.sign_func = sign_func
+        self.max_connecting = max_connecting
+        self.fetcher_cls = fetcher_cls
+        self.fetcher_kwargs = fetcher_kwargs
+        self.fetchers = {}
+        self._pending = list(live_ids)
+        self._tasks = {}
+        self._session = None
+        self._semaphore = None
+        self._stopped = None
+
+    def add(self, live_id):
+        """
+        添加直播间，run()运行中添加的直播间会立即开始抓取
+        """
+        if live_id in self.fetchers or live_id in self._pending:
+            return
+        if self._session is None:
+            self._pending.append(live_id)
+        else:
+            self._startRoom(live_id)
+
+    def remove(self, live_id):
+        """
+        停止并移除直播间
+        """
+        if live_id in self._pending:
+            self._pending.remove(live_id)
+        fetcher = self.fetchers.get(live_id)
+        if fetcher is not None:
+            fetcher.stop()
+
+    def stop(self):
+        """
+        停止所有直播间
+        """
+        for fetcher in list(self.fetchers.values()):
+            fetcher.stop()
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def run(self):
+        """
+        运行所有直播间，直到调用stop()
+        """
+        self._semaphore = asyncio.Semaphore(self.max_connecting)
+        self._stopped = asyncio.Event()
+        async with aiohttp.ClientSession() as session:
+            self._session = session
+            for live_id in self._pending:
+                self._startRoom(live_id)
+            self._pending = []
+            try:
+                await self._stopped.wait()
+            finally:
+                self.stop()
+                if self._tasks:
+                    await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+                self._session = None
+
+    def _startRoom(self, live_id):
+        fetcher = self.fetcher_cls(live_id, sign_func=self.sign_func, **self.fetcher_kwargs)
+        self.fetchers[live_id] = fetcher
+        self._tasks[live_id] = asyncio.get_running_loop().create_task(self._runRoom(fetcher))
+
+    async def _runRoom(self, fetcher):
+        try:
+            await fetcher.start(self._session, self._semaphore)
+        except Exception as err:
+            print(f"【X】Room {fetcher.live_id} error: ", err)
+        finally:
+            self.fetchers.pop(fetcher.live_id, None)
+            self._tasks.pop(fetcher.live_id, None)
+
+
+if __name__ == '__main__':
+    import sys
+
+    pool = RoomPool(sys.argv[1:] or ['243749493750'])
+    try:
+        asyncio.run(pool.run())
+    except KeyboardInterrupt:
+        pass
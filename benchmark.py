@@ -0,0 +1,398 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    benchmark.py
+# @Time:        2025/1/20 16:12
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+性能测试，使用合成的PushFrame -> gzip -> Response数据，结果以json输出，便于不同版本之间对比：
+    python benchmark.py decoder              对比betterproto与fast两种解析后端
+    python benchmark.py pipeline             完整_wsOnMessage流程的帧率、消息速率、单帧延迟分位数与内存分配
+    python benchmark.py stages               gzip、帧解析、Response解析、消息体解析、分发各阶段耗时
+    python benchmark.py signature            generateSignature耗时
+    python benchmark.py imports              import liveMan的耗时与内存，超出预算时以非0状态码退出，可用于CI
+    python benchmark.py all --output bench.json
+"""
+
+import argparse
+import functools
+import gzip
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from frameDecoder import DECODER_BACKENDS, METHOD_TYPES, getParser, scanResponse
+from protobuf.douyin import *
+
+# 热门直播间中各类消息的大致占比
+DEFAULT_MIX = {
+    'WebcastMemberMessage': 0.45,
+    'WebcastLikeMessage': 0.33,
+    'WebcastChatMessage': 0.14,
+    'WebcastGiftMessage': 0.05,
+    'WebcastRoomUserSeqMessage': 0.03,
+}
+
+
+def _randomUser(rnd, user_id):
+    return User(id=user_id, short_id=rnd.randrange(1 << 40), nick_name=f"用户{user_id}",
+                gender=rnd.randrange(2), level=rnd.randrange(50),
+                avatar_thumb=Image(url_list_list=[f"https://p3.douyinpic.com/aweme/100x100/{user_id}.jpeg"] * 3,
+                                   uri=f"aweme-avatar/{user_id}"),
+                badge_image_list=[Image(uri=f"badge_{i}", height=32, width=64) for i in range(rnd.randrange(3))],
+                pay_grade=PayGrade(level=rnd.randrange(60), name="等级"),
+                fans_club=FansClub(data=FansClubData(club_name="粉丝团", level=rnd.randrange(20))),
+                display_id=str(user_id), sec_uid=f"MS4wLjABAAAA{user_id:020d}", id_str=str(user_id))
+
+
+@functools.lru_cache(maxsize=None)
+def _viewer(user_id):
+    # 同一观众在各条消息中的信息保持一致，与真实直播间相同
+    return _randomUser(random.Random(user_id), user_id)
+
+
+def _user(rnd, user_id, stable_viewers=False):
+    """
+    :param stable_viewers: 为False时每条消息中的观众信息都随机生成，与最初的基线语料一致
+    """
+    if stable_viewers:
+        return _viewer(user_id)
+    return _randomUser(rnd, user_id)
+
+
+def _common(rnd, method, room_id, create_time):
+    return Common(method=method, msg_id=rnd.randrange(1 << 62), room_id=room_id, create_time=create_time)
+
+
+def buildMessage(rnd, method, room_id=7319483754668557238, create_time=None, user_id=None,
+                 stable_viewers=False):
+    """
+    按method构造一条消息体
+    :param stable_viewers: 同一user_id的观众信息是否保持一致
+    :return: betterproto结构体
+    """
+    if create_time is None:
+        create_time = int(time.time() * 1000)
+    if user_id is None:
+        user_id = rnd.randrange(1, 1 << 50)
+    common = _common(rnd, method, room_id, create_time)
+    if method == 'WebcastChatMessage':
+        return ChatMessage(common=common, user=_user(rnd, user_id, stable_viewers), content="主播好" * rnd.randrange(1, 6),
+                           event_time=create_time // 1000)
+    if method == 'WebcastGiftMessage':
+        gift_id = rnd.choice((463, 685, 3389))
+        combo = rnd.randrange(1, 30)
+        return GiftMessage(common=common, gift_id=gift_id, group_count=1, repeat_count=combo, combo_count=combo,
+                           user=_user(rnd, user_id, stable_viewers), to_user=User(id=1, nick_name="主播"),
+                           repeat_end=rnd.randrange(2), group_id=rnd.randrange(1 << 40),
+                           gift=GiftStruct(id=gift_id, name="小心心", diamond_count=1, combo=True,
+                                           image=Image(uri=f"webcast/{gift_id}", url_list_list=["https://x"] * 2)))
+    if method == 'WebcastLikeMessage':
+        return LikeMessage(common=common, count=rnd.randrange(1, 20), total=rnd.randrange(1 << 20),
+                           user=_user(rnd, user_id, stable_viewers))
+    if method == 'WebcastMemberMessage':
+        return MemberMessage(common=common, user=_user(rnd, user_id, stable_viewers),
+                             member_count=rnd.randrange(1 << 16), action=1)
+    if method == 'WebcastRoomUserSeqMessage':
+        return RoomUserSeqMessage(common=common, total=rnd.randrange(1 << 16), total_pv_for_anchor="43.6万",
+                                  total_user=rnd.randrange(1 << 20))
+    raise ValueError(f"unsupported method {method}")
+
+
+def buildCorpus(frames=500, messages_per_frame=20, mix=None, seed=1, viewers=5000, stable_viewers=False):
+    """
+    生成合成的websocket帧
+    :param frames: 帧数
+    :param messages_per_frame: 每帧平均消息数
+    :param mix: method -> 占比，默认DEFAULT_MIX
+    :param viewers: 观众数，消息中的用户从中随机抽取，模拟同一观众重复出现
+    :param stable_viewers: 同一观众在各条消息中的等级、头像等信息保持一致（users.UserTable的测试场景），
+                           默认每条消息随机生成，与早期版本的结果可以直接对比
+    :return: PushFrame编码后的bytes列表
+    """
+    rnd = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    methods = list(mix)
+    weights = [mix[method] for method in methods]
+    user_ids = [rnd.randrange(1, 1 << 50) for _ in range(viewers)]
+    create_time = 1721106114633
+    corpus = []
+    for seq in range(frames):
+        count = max(1, int(rnd.gauss(messages_per_frame, messages_per_frame / 4)))
+        messages_list = []
+        for method in rnd.choices(methods, weights, k=count):
+            create_time += rnd.randrange(0, 50)
+            payload = bytes(buildMessage(rnd, method, create_time=create_time, user_id=rnd.choice(user_ids),
+                                        stable_viewers=stable_viewers))
+            messages_list.append(Message(method=method, payload=payload, msg_id=rnd.randrange(1 << 62)))
+        response = Response(messages_list=messages_list, cursor=f"t-{create_time}_r-1", fetch_interval=0,
+                            now=create_time, internal_ext=f"internal_src:dim|fetch_time:{create_time}|seq:{seq}",
+                            need_ack=True)
+        corpus.append(bytes(PushFrame(seq_id=seq, log_id=rnd.randrange(1 << 63), payload_type='msg',
+                                      payload_encoding='pb', payload=gzip.compress(bytes(response)))))
+    return corpus
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+class _NullSocket:
+
+    def send(self, data, opcode=None):
+        pass
+
+    def close(self):
+        pass
+
+
+def _newFetcher(decoder):
+    from liveMan import DouyinLiveWebFetcher
+    return DouyinLiveWebFetcher("bench", decoder=decoder, sinks=[])
+
+
+def benchPipeline(corpus, decoder='betterproto'):
+    """
+    完整的_wsOnMessage流程：帧解析、解压、Response解析、ack、消息体解析与事件分发
+    """
+    fetcher = _newFetcher(decoder)
+    ws = _NullSocket()
+    messages = sum(len(scanResponse(gzip.decompress(PushFrame().parse(frame).payload)).messages_list)
+                   for frame in corpus)
+    latencies = []
+    start = time.perf_counter()
+    for frame in corpus:
+        frame_start = time.perf_counter()
+        fetcher._wsOnMessage(ws, frame)
+        latencies.append(time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+
+    # 内存分配单独统计，tracemalloc本身会拖慢执行
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for frame in corpus:
+        fetcher._wsOnMessage(ws, frame)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+    result = {
+        "frames": len(corpus),
+        "messages": messages,
+        "elapsed_s": elapsed,
+        "frames_per_sec": len(corpus) / elapsed,
+        "messages_per_sec": messages / elapsed,
+        "peak_traced_bytes": peak,
+        "retained_bytes": allocated,
+    }
+    result.update(_percentiles(latencies))
+    return result
+
+
+def benchStages(corpus, decoder='betterproto'):
+    """
+    分阶段耗时：gzip解压、PushFrame解析、Response扫描、消息体解析、事件分发（含消息体解析）
+    """
+    parse = getParser(decoder)
+    fetcher = _newFetcher(decoder)
+    timings = {"frame_parse": [], "gzip": [], "response_parse": [], "payload_parse": [], "dispatch": []}
+    perf_counter = time.perf_counter
+    for frame in corpus:
+        t0 = perf_counter()
+        package = parse(PushFrame, frame)
+        t1 = perf_counter()
+        data = gzip.decompress(package.payload)
+        t2 = perf_counter()
+        response = scanResponse(data, fetcher._method_filter, parse)
+        t3 = perf_counter()
+        for msg in response.messages_list:
+            parse(METHOD_TYPES[msg.method], msg.payload)
+        t4 = perf_counter()
+        fetcher._dispatchMessages(response.messages_list)
+        t5 = perf_counter()
+        timings["frame_parse"].append(t1 - t0)
+        timings["gzip"].append(t2 - t1)
+        timings["response_parse"].append(t3 - t2)
+        timings["payload_parse"].append(t4 - t3)
+        timings["dispatch"].append(t5 - t4)
+    results = {}
+    for stage, samples in timings.items():
+        results[stage] = {"total_s": sum(samples)}
+        results[stage].update(_percentiles(samples))
+    return results
+
+
+def benchSignature(iterations=20):
+    """
+    generateSignature耗时：首次调用（加载sign.js）、签名缓存未命中与命中
+    """
+    import liveMan
+    import signer
+
+    cache = signer.configureSignatureCache()
+    wss = "wss://webcast5-ws-web-hl.douyin.com/webcast/im/push/v2/?aid=6383&live_id=1&room_id={}"
+    start = time.perf_counter()
+    liveMan.generateSignature(wss.format(0))
+    cold = time.perf_counter() - start
+    misses = []
+    for i in range(1, iterations + 1):
+        start = time.perf_counter()
+        liveMan.generateSignature(wss.format(i))
+        misses.append(time.perf_counter() - start)
+    hits = []
+    for i in range(1, iterations + 1):
+        start = time.perf_counter()
+        liveMan.generateSignature(wss.format(i))
+        hits.append(time.perf_counter() - start)
+    return {
+        "cold_us": cold * 1e6,
+        "miss": _percentiles(misses),
+        "hit": _percentiles(hits),
+        "cache": cache.stats(),
+    }
+
+
+# import liveMan时不应加载的模块，只在建连、签名、获取room_id或旧版签名方式中用到
+LAZY_MODULES = ('requests', 'urllib3', 'execjs', 'py_mini_racer', 'unittest.mock', 'websocket', 'aiohttp')
+
+_IMPORT_PROBE = """
+import json, sys, time, tracemalloc
+trace = sys.argv[2] == '1'
+if trace:
+    tracemalloc.start()
+start = time.perf_counter()
+__import__(sys.argv[1])
+seconds = time.perf_counter() - start
+memory = tracemalloc.get_traced_memory()[0] if trace else 0
+print(json.dumps({"seconds": seconds, "memory": memory, "modules": sorted(sys.modules)}))
+"""
+
+
+def benchImports(runs=5, module='liveMan', max_ms=350, max_mb=14):
+    """
+    在全新的解释器中测量import耗时（取中位数）与import分配的内存，超出预算或提前加载了LAZY_MODULES时ok为False
+    """
+    import os
+    import subprocess
+
+    def probe(trace):
+        output = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, module, '1' if trace else '0'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True, capture_output=True,
+                                text=True).stdout
+        return json.loads(output)
+
+    samples = sorted(probe(False)["seconds"] for _ in range(runs))
+    traced = probe(True)
+    median_ms = samples[len(samples) // 2] * 1e3
+    memory_mb = traced["memory"] / 1e6
+    lazy_loaded = [name for name in LAZY_MODULES if name in traced["modules"]]
+    return {
+        "module": module,
+        "median_ms": median_ms,
+        "max_ms": samples[-1] * 1e3,
+        "memory_mb": memory_mb,
+        "modules": len(traced["modules"]),
+        "lazy_loaded": lazy_loaded,
+        "budget": {"max_ms": max_ms, "max_mb": max_mb},
+        "ok": median_ms <= max_ms and memory_mb <= max_mb and not lazy_loaded,
+    }
+
+
+def benchDecoder(iterations=2000, seed=1):
+    """
+    对比两种解析后端解析热点结构体的耗时，并校验解析结果一致
+    """
+    rnd = random.Random(seed)
+    samples = {
+        'ChatMessage': bytes(buildMessage(rnd, 'WebcastChatMessage')),
+        'GiftMessage': bytes(buildMessage(rnd, 'WebcastGiftMessage')),
+        'MemberMessage': bytes(buildMessage(rnd, 'WebcastMemberMessage')),
+        'LikeMessage': bytes(buildMessage(rnd, 'WebcastLikeMessage')),
+        'User': bytes(_user(rnd, 123456789)),
+        'PushFrame': bytes(PushFrame(seq_id=1, log_id=rnd.randrange(1 << 63), payload_type='msg',
+                                     headers_list=[HeadersList(key='compress_type', value='gzip')],
+                                     payload=bytes(rnd.randrange(256) for _ in range(512)))),
+    }
+    results = {}
+    for type_name, data in samples.items():
+        message_type = globals()[type_name]
+        reference = getParser('betterproto')(message_type, data)
+        results[type_name] = {}
+        for backend in DECODER_BACKENDS:
+            parse = getParser(backend)
+            if parse(message_type, data) != reference:
+                raise AssertionError(f"{backend} decoded {type_name} differently from betterproto")
+            start = time.perf_counter()
+            for _ in range(iterations):
+                parse(message_type, data)
+            elapsed = time.perf_counter() - start
+            results[type_name][backend] = {"us_per_op": elapsed / iterations * 1e6,
+                                           "ops_per_sec": iterations / elapsed}
+        results[type_name]["speedup"] = (results[type_name]['betterproto']["us_per_op"]
+                                         / results[type_name]['fast']["us_per_op"])
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="douyinLiveWebFetcher benchmark")
+    parser.add_argument("suite", choices=["decoder", "pipeline", "stages", "signature", "imports", "all"])
+    parser.add_argument("--iterations", type=int, default=2000, help="decoder每种结构体的解析次数")
+    parser.add_argument("--frames", type=int, default=500, help="合成的帧数")
+    parser.add_argument("--messages-per-frame", type=int, default=20)
+    parser.add_argument("--decoder", default=None, help="只测试指定的解析后端，默认全部")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stable-viewers", action="store_true", help="同一观众在各条消息中的信息保持一致")
+    parser.add_argument("--max-import-ms", type=float, default=350, help="imports的耗时预算（毫秒）")
+    parser.add_argument("--max-import-mb", type=float, default=14, help="imports的内存预算（MB）")
+    parser.add_argument("--output", default=None, help="结果写入的json文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    backends = [args.decoder] if args.decoder else list(DECODER_BACKENDS)
+    suites = ["decoder", "pipeline", "stages", "signature", "imports"] if args.suite == "all" else [args.suite]
+    results = {}
+    bench_corpus = None
+    if "pipeline" in suites or "stages" in suites:
+        bench_corpus = buildCorpus(args.frames, args.messages_per_frame, seed=args.seed,
+                                   stable_viewers=args.stable_viewers)
+    for suite in suites:
+        if suite == "decoder":
+            results[suite] = benchDecoder(args.iterations, args.seed)
+        elif suite == "pipeline":
+            results[suite] = {backend: benchPipeline(bench_corpus, backend) for backend in backends}
+        elif suite == "stages":
+            results[suite] = {backend: benchStages(bench_corpus, backend) for backend in backends}
+        elif suite == "signature":
+            results[suite] = benchSignature()
+        elif suite == "imports":
+            results[suite] = benchImports(max_ms=args.max_import_ms, max_mb=args.max_import_mb)
+
+    report = {
+        "suite": args.suite,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "time": int(time.time()),
+        "params": {"frames": args.frames, "messages_per_frame": args.messages_per_frame, "seed": args.seed,
+                   "stable_viewers": args.stable_viewers},
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if not results.get("imports", {}).get("ok", True):
+        sys.exit(1)
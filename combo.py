@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    combo.py
+# @Time:        2025/2/17 22:40
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+礼物连击合并：一次连击会推送多条GiftMessage，combo_count/repeat_count逐条递增，
+同一连击的group_id相同，最后一条repeat_end为1。GiftComboSink以(用户id, 礼物id, group_id)为键
+跟踪连击，连击结束时只向下游输出一条带最终数量的GiftEvent，可选按间隔输出进度；
+没有收到结束消息的连击由时间轮在超时后结束，内存占用有上限：
+    DouyinLiveWebFetcher(live_id, sinks=[GiftComboSink(ConsoleSink(), progress_interval=1)]).start()
+"""
+
+import dataclasses
+import threading
+import time
+
+from events import GiftEvent
+from sinks import Sink
+
+
+class TimerWheel:
+
+    def __init__(self, tick=0.5, slots=128, now=None):
+        """
+        时间轮：按tick把到期时间分到环形的槽中，到期检查与调度都是O(1)
+        :param tick: 每个槽的时间跨度（秒）
+        :param slots: 槽数，超过一圈的到期时间在被取出时由调用方重新调度
+        """
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.current = int((time.time() if now is None else now) // tick)
+
+    def schedule(self, key, deadline):
+        index = max(int(deadline // self.tick), self.current + 1)
+        self.slots[index % len(self.slots)].add(key)
+
+    def advance(self, now):
+        """
+        前进到now
+        :return: 经过的槽中登记的键，调用方需自行确认是否真正到期
+        """
+        target = int(now // self.tick)
+        if target <= self.current:
+            return []
+        expired = []
+        steps = min(target - self.current, len(self.slots))
+        for step in range(self.current + 1, self.current + 1 + steps):
+            slot = self.slots[step % len(self.slots)]
+            if slot:
+                expired.extend(slot)
+                slot.clear()
+        self.current = target
+        return expired
+
+    def __len__(self):
+        return sum(len(slot) for slot in self.slots)
+
+
+class _Combo:
+    __slots__ = ('event', 'messages', 'deadline', 'last_progress')
+
+    def __init__(self, event, deadline, now):
+        self.event = event
+        self.messages = 1
+        self.deadline = deadline
+        self.last_progress = now
+
+
+class GiftComboSink(Sink):
+
+    def __init__(self, sink, progress_interval=None, timeout=10, tick=0.5, max_combos=100000):
+        """
+        把同一连击的多条礼物消息合并为一条
+        :param sink: 下游sink，非礼物事件与非连击礼物原样转发
+        :param progress_interval: 连击进行中每隔多少秒输出一次进度（repeat_end为0），None不输出
+        :param timeout: 连击超过该秒数没有新消息时视为结束
+        :param tick: 时间轮精度（秒）
+        :param max_combos: 同时跟踪的连击数上限，超出时最早的连击提前结束
+        """
+        self.sink = sink
+        self.progress_interval = progress_interval
+        self.timeout = timeout
+        self.max_combos = max_combos
+        self.merged = 0
+        self.finished = 0
+        self.expired = 0
+        self._combos = {}
+        self._wheel = TimerWheel(tick, max(8, int(timeout / tick) + 2))
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._expireLoop, args=(tick,), name='gift-combo', daemon=True)
+        self._thread.start()
+
+    def emitBatch(self, events):
+        now = time.time()
+        with self._lock:
+            output = self._expire(now)
+            for event in events:
+                if type(event) is GiftEvent and event.combo:
+                    self._track(event, now, output)
+                else:
+                    output.append(event)
+            if output:
+                self.sink.emitBatch(output)
+
+    def _track(self, event, now, output):
+        key = (event.user_id, event.gift_id, event.group_id)
+        state = self._combos.get(key)
+        if state is None:
+            if event.repeat_end:
+                output.append(dataclasses.replace(event, collapsed=1))
+                self.finished += 1
+                return
+            state = self._combos[key] = _Combo(event, now + self.timeout, now)
+            self._wheel.schedule(key, state.deadline)
+            if len(self._combos) > self.max_combos:
+                oldest = next(iter(self._combos))
+                output.append(self._finish(oldest))
+                self.expired += 1
+        else:
+            state.messages += 1
+            self.merged += 1
+            # 乱序到达时保留最大的数量
+            if event.combo_count >= state.event.combo_count or event.repeat_end:
+                state.event = dataclasses.replace(event, combo_count=max(event.combo_count, state.event.combo_count),
+                                                  repeat_count=max(event.repeat_count, state.event.repeat_count))
+            # 时间轮中的键不移动，到期检查时发现deadline延后再重新调度
+            state.deadline = now + self.timeout
+        if event.repeat_end:
+            output.append(self._finish(key))
+            self.finished += 1
+        elif self.progress_interval is not None and now - state.last_progress >= self.progress_interval:
+            state.last_progress = now
+            output.append(dataclasses.replace(state.event, repeat_end=0, collapsed=state.messages))
+
+    def _finish(self, key):
+        state = self._combos.pop(key)
+        return dataclasses.replace(state.event, repeat_end=1, collapsed=state.messages)
+
+    def _expire(self, now):
+        output = []
+        for key in self._wheel.advance(now):
+            state = self._combos.get(key)
+            if state is None:
+                continue
+            if state.deadline > now:
+                self._wheel.schedule(key, state.deadline)
+                continue
+            output.append(self._finish(key))
+            self.expired += 1
+        return output
+
+    def pending(self):
+        """
+        :return: 正在进行的连击数
+        """
+        return len(self._combos)
+
+    def flush(self):
+        with self._lock:
+            output = self._expire(time.time())
+            if output:
+                self.sink.emitBatch(output)
+        self.sink.flush()
+
+    def close(self):
+        """
+        停止后台线程，所有未结束的连击按当前数量输出
+        """
+        self._closed.set()
+        self._thread.join()
+        with self._lock:
+            output = [self._finish(key) for key in list(self._combos)]
+            if output:
+                self.sink.emitBatch(output)
+        self.sink.close()
+
+    def stats(self):
+        return {"pending": len(self._combos), "merged": self.merged, "finished": self.finished,
+                "expired": self.expired}
+
+    def _expireLoop(self, tick):
+        while not self._closed.wait(tick):
+            try:
+                with self._lock:
+                    output = self._expire(time.time())
+                    if output:
+                        self.sink.emitBatch(output)
+            except Exception as err:
+                print("【X】Sink emit error: ", err)
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    dedup.py
+# @Time:        2025/2/19 21:12
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+消息去重：重连后或服务端补发时同一条消息（Message.msg_id）会被推送多次。
+MsgIdDeduper在分发前按msg_id判断，重复消息直接跳过，不会解析消息体：
+    DouyinLiveWebFetcher(live_id, dedup=MsgIdDeduper(window=600)).start()
+"""
+
+import threading
+import time
+
+
+class MsgIdDeduper:
+
+    def __init__(self, window=600, buckets=10, max_per_bucket=200000):
+        """
+        按时间分桶的环形哈希表：每个桶是一段时间内见过的msg_id集合，桶轮转时整体丢弃最早的桶，
+        内存上限为 buckets * max_per_bucket 个msg_id，长时间运行也不会增长
+        :param window: 去重的时间窗口（秒）
+        :param buckets: 窗口分成的桶数
+        :param max_per_bucket: 每个桶最多保存的msg_id数，写满时提前轮转（此时实际窗口会缩短）
+        """
+        self.bucket_seconds = window / buckets
+        self.max_per_bucket = max_per_bucket
+        self.seen_count = 0
+        self.duplicates = 0
+        self.rotations = 0
+        self._buckets = [set() for _ in range(buckets)]
+        self._current = self._buckets[0]
+        self._index = 0
+        self._rotate_at = time.monotonic() + self.bucket_seconds
+        self._lock = threading.Lock()
+
+    def _rotate(self, now):
+        buckets = self._buckets
+        steps = 1
+        if now >= self._rotate_at:
+            # 长时间没有消息时一次轮转多个桶
+            steps = min(len(buckets), int((now - self._rotate_at) // self.bucket_seconds) + 1)
+        for _ in range(steps):
+            self._index = (self._index + 1) % len(buckets)
+            buckets[self._index].clear()
+        self._current = buckets[self._index]
+        self._rotate_at = now + self.bucket_seconds
+        self.rotations += 1
+
+    def isDuplicate(self, msg_id):
+        """
+        :return: msg_id在窗口内出现过时返回True，否则记录下来并返回False
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._rotate_at or len(self._current) >= self.max_per_bucket:
+                self._rotate(now)
+            self.seen_count += 1
+            for bucket in self._buckets:
+                if msg_id in bucket:
+                    self.duplicates += 1
+                    return True
+            self._current.add(msg_id)
+            return False
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets)
+
+    def clear(self):
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.clear()
+
+    def stats(self):
+        return {
+            "seen": self.seen_count,
+            "duplicates": self.duplicates,
+            "duplicate_rate": self.duplicates / self.seen_count if self.seen_count else 0.0,
+            "size": len(self),
+            "rotations": self.rotations,
+        }
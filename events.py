@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    events.py
+# @Time:        2025/1/24 10:08
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+from dataclasses import dataclass, field
+from typing import Any, List
+
+
+@dataclass
+class LiveEvent:
+    """
+    各类直播间事件的公共字段
+    """
+    live_id: str = ''
+    method: str = ''
+    # Common.msg_id
+    msg_id: int = 0
+    # Common.create_time，毫秒时间戳
+    create_time: int = 0
+
+    def format(self):
+        """
+        控制台输出的文本，返回空字符串表示不输出
+        """
+        return ''
+
+
+@dataclass
+class UserEvent(LiveEvent):
+    user_id: int = 0
+    user_name: str = ''
+    # 完整的User结构体
+    user: Any = None
+
+
+@dataclass
+class ChatEvent(UserEvent):
+    content: str = ''
+
+    def format(self):
+        return f"【聊天msg】[{self.user_id}]{self.user_name}: {self.content}"
+
+
+@dataclass
+class GiftEvent(UserEvent):
+    gift_id: int = 0
+    gift_name: str = ''
+    diamond_count: int = 0
+    combo_count: int = 0
+    repeat_count: int = 0
+    group_count: int = 0
+    group_id: int = 0
+    repeat_end: int = 0
+    # GiftStruct.combo，连击礼物会在连击过程中持续推送，repeat_end为1时结束
+    combo: bool = False
+    # combo.GiftComboSink合并的原始消息数，0表示未经合并
+    collapsed: int = 0
+
+    def format(self):
+        return f"【礼物msg】{self.user_name} 送出了 {self.gift_name}x{self.combo_count}"
+
+
+@dataclass
+class LikeEvent(UserEvent):
+    count: int = 0
+    total: int = 0
+
+    def format(self):
+        return f"【点赞msg】{self.user_name} 点了{self.count}个赞"
+
+
+@dataclass
+class MemberEvent(UserEvent):
+    gender: int = 0
+
+    def format(self):
+        return f"【进场msg】[{self.user_id}][{['女', '男'][self.gender]}]{self.user_name} 进入了直播间"
+
+
+@dataclass
+class SocialEvent(UserEvent):
+
+    def format(self):
+        return f"【关注msg】[{self.user_id}]{self.user_name} 关注了主播"
+
+
+@dataclass
+class RoomUserSeqEvent(LiveEvent):
+    # 当前观看人数
+    current: int = 0
+    # 累计观看人数
+    total: str = ''
+
+    def format(self):
+        return f"【统计msg】当前观看人数: {self.current}, 累计观看人数: {self.total}"
+
+
+@dataclass
+class FansclubEvent(LiveEvent):
+    content: str = ''
+
+    def format(self):
+        return f"【粉丝团msg】 {self.content}"
+
+
+@dataclass
+class EmojiChatEvent(UserEvent):
+    emoji_id: int = 0
+    default_content: str = ''
+    common: Any = None
+
+    def format(self):
+        return (f"【聊天表情包id】 {self.emoji_id},user：{self.user},common:{self.common},"
+                f"default_content:{self.default_content}")
+
+
+@dataclass
+class RoomEvent(LiveEvent):
+    room_id: int = 0
+
+    def format(self):
+        return f"【直播间msg】直播间id:{self.room_id}"
+
+
+@dataclass
+class RoomStatsEvent(LiveEvent):
+    display_long: str = ''
+
+    def format(self):
+        return f"【直播间统计msg】{self.display_long}"
+
+
+@dataclass
+class RankEvent(LiveEvent):
+    ranks_list: List[Any] = field(default_factory=list)
+
+    def format(self):
+        return f"【直播间排行榜msg】{self.ranks_list}"
+
+
+@dataclass
+class ControlEvent(LiveEvent):
+    # 3表示直播已结束
+    status: int = 0
+
+    def format(self):
+        return "直播间已结束" if self.status == 3 else ''
+
+
+@dataclass
+class RoomRollupEvent(LiveEvent):
+    """
+    analytics.AnalyticsSink按固定周期汇总的直播间统计
+    """
+    # 统计周期开始时间，秒
+    window_start: float = 0.0
+    window_seconds: float = 0.0
+    chats: int = 0
+    likes: int = 0
+    gifts: int = 0
+    members: int = 0
+    follows: int = 0
+    # 周期结束时的在线人数，以及周期内的变化
+    viewers: int = 0
+    viewers_delta: int = 0
+
+    def format(self):
+        return (f"【汇总msg】{self.window_seconds:.0f}秒内 聊天: {self.chats}, 点赞: {self.likes}, 礼物: {self.gifts}, "
+                f"进场: {self.members}, 关注: {self.follows}, 在线人数: {self.viewers}({self.viewers_delta:+d})")
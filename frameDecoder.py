@@ -0,0 +1,586 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    frameDecoder.py
+# @Time:        2025/1/18 11:05
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+直接在protobuf编码上扫描Response，按Message.method的原始字节过滤消息，
+未订阅的消息体不做任何解析，订阅的消息体也保持原始bytes，首次访问时才解析。
+
+解析后端：
+    betterproto  使用protobuf/douyin.py中的结构体解析
+    fast         热点结构体（PushFrame、ChatMessage、GiftMessage、User等）使用预先生成的专用解析表，
+                 字段值与betterproto一致，python benchmark.py可对比两者性能
+"""
+
+import struct
+import threading
+
+import betterproto
+
+from protobuf.douyin import *
+
+# method -> 消息体结构体
+METHOD_TYPES = {
+    'WebcastChatMessage': ChatMessage,
+    'WebcastGiftMessage': GiftMessage,
+    'WebcastLikeMessage': LikeMessage,
+    'WebcastMemberMessage': MemberMessage,
+    'WebcastSocialMessage': SocialMessage,
+    'WebcastRoomUserSeqMessage': RoomUserSeqMessage,
+    'WebcastFansclubMessage': FansclubMessage,
+    'WebcastControlMessage': ControlMessage,
+    'WebcastEmojiChatMessage': EmojiChatMessage,
+    'WebcastRoomStatsMessage': RoomStatsMessage,
+    'WebcastRoomMessage': RoomMessage,
+    'WebcastRoomRankMessage': RoomRankMessage,
+}
+
+_INT64_SIGN = 1 << 63
+_UINT64 = 1 << 64
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def readVarint(buf, pos):
+    """
+    读取一个varint
+    :return: (值, 新位置)
+    """
+    result = 0
+    shift = 0
+    while True:
+        try:
+            b = buf[pos]
+        except IndexError:
+            raise DecodeError("truncated varint")
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 70:
+            raise DecodeError("varint too long")
+
+
+def toInt64(value):
+    return value - _UINT64 if value >= _INT64_SIGN else value
+
+
+def iterFields(buf, pos=0, end=None):
+    """
+    遍历protobuf编码中的字段
+    :return: 生成 (字段号, wire type, 值)，varint/fixed为int，length-delimited为(起始, 结束)下标
+    """
+    if end is None:
+        end = len(buf)
+    while pos < end:
+        key, pos = readVarint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = readVarint(buf, pos)
+        elif wire_type == 2:
+            length, pos = readVarint(buf, pos)
+            value = (pos, pos + length)
+            pos += length
+        elif wire_type == 1:
+            value = int.from_bytes(buf[pos:pos + 8], 'little')
+            pos += 8
+        elif wire_type == 5:
+            value = int.from_bytes(buf[pos:pos + 4], 'little')
+            pos += 4
+        else:
+            raise DecodeError(f"unsupported wire type {wire_type}")
+        if pos > end:
+            raise DecodeError("truncated field")
+        yield field, wire_type, value
+
+
+class LazyMessage:
+    """
+    Response中的单条Message，payload保持原始bytes，访问parsed时才按method解析为对应结构体
+    """
+    __slots__ = ('method', 'payload', 'msg_id', 'msg_type', 'offset', '_parse', '_parsed')
+
+    def __init__(self, method, payload=b'', msg_id=0, msg_type=0, offset=0, parse=None):
+        self.method = method
+        self.payload = payload
+        self.msg_id = msg_id
+        self.msg_type = msg_type
+        self.offset = offset
+        self._parse = parse
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            message_type = METHOD_TYPES.get(self.method)
+            if message_type is None:
+                raise KeyError(f"unknown method {self.method}")
+            if self._parse is None:
+                self._parsed = message_type().parse(self.payload)
+            else:
+                self._parsed = self._parse(message_type, self.payload)
+        return self._parsed
+
+    def __repr__(self):
+        return f"LazyMessage(method={self.method!r}, msg_id={self.msg_id}, payload={len(self.payload)} bytes)"
+
+
+class RawResponse:
+    """
+    与protobuf.douyin.Response字段一致，messages_list中为通过过滤的LazyMessage
+    """
+    __slots__ = ('messages_list', 'cursor', 'fetch_interval', 'now', 'internal_ext', 'fetch_type',
+                 'route_params', 'heartbeat_duration', 'need_ack', 'push_server', 'live_cursor',
+                 'history_no_more', 'skipped')
+
+    def __init__(self):
+        self.messages_list = []
+        self.cursor = ''
+        self.fetch_interval = 0
+        self.now = 0
+        self.internal_ext = ''
+        self.fetch_type = 0
+        self.route_params = {}
+        self.heartbeat_duration = 0
+        self.need_ack = False
+        self.push_server = ''
+        self.live_cursor = ''
+        self.history_no_more = False
+        # 被过滤掉的消息条数
+        self.skipped = 0
+
+    def bindParser(self, parse):
+        """
+        更换messages_list中消息体的解析函数，如流水线中扫描后换成带耗时统计的解析函数
+        """
+        for msg in self.messages_list:
+            msg._parse = parse
+
+
+def _scanMessage(buf, start, end, methods, parse):
+    method = None
+    payload = None
+    msg_id = msg_type = offset = 0
+    for field, wire_type, value in iterFields(buf, start, end):
+        if field == 1 and wire_type == 2:
+            method = buf[value[0]:value[1]]
+            # 先比较原始字节，未订阅的消息直接丢弃
+            if methods is not None and method not in methods:
+                return None
+        elif field == 2 and wire_type == 2:
+            payload = value
+        elif field == 3 and wire_type == 0:
+            msg_id = toInt64(value)
+        elif field == 4 and wire_type == 0:
+            msg_type = toInt64(value)
+        elif field == 5 and wire_type == 0:
+            offset = toInt64(value)
+    if method is None and methods is not None:
+        return None
+    return LazyMessage(str(method, 'utf-8') if method is not None else '',
+                       bytes(buf[payload[0]:payload[1]]) if payload else b'',
+                       msg_id, msg_type, offset, parse)
+
+
+def _decodeString(buf, value):
+    return bytes(buf[value[0]:value[1]]).decode('utf-8')
+
+
+def scanResponse(data, methods=None, parse=None):
+    """
+    扫描解压后的Response
+    :param data: Response的protobuf编码
+    :param methods: 需要保留的method原始字节集合，如{b'WebcastChatMessage'}，None表示全部保留
+    :param parse: LazyMessage.parsed使用的解析函数，见getParser，默认为betterproto
+    :return: RawResponse
+    """
+    buf = memoryview(data)
+    response = RawResponse()
+    messages_list = response.messages_list
+    for field, wire_type, value in iterFields(buf):
+        if field == 1 and wire_type == 2:
+            msg = _scanMessage(buf, value[0], value[1], methods, parse)
+            if msg is None:
+                response.skipped += 1
+            else:
+                messages_list.append(msg)
+        elif field == 2 and wire_type == 2:
+            response.cursor = _decodeString(buf, value)
+        elif field == 3 and wire_type == 0:
+            response.fetch_interval = value
+        elif field == 4 and wire_type == 0:
+            response.now = value
+        elif field == 5 and wire_type == 2:
+            response.internal_ext = _decodeString(buf, value)
+        elif field == 6 and wire_type == 0:
+            response.fetch_type = value & 0xffffffff
+        elif field == 7 and wire_type == 2:
+            key = val = ''
+            for entry_field, entry_type, entry_value in iterFields(buf, value[0], value[1]):
+                if entry_field == 1 and entry_type == 2:
+                    key = _decodeString(buf, entry_value)
+                elif entry_field == 2 and entry_type == 2:
+                    val = _decodeString(buf, entry_value)
+            response.route_params[key] = val
+        elif field == 8 and wire_type == 0:
+            response.heartbeat_duration = value
+        elif field == 9 and wire_type == 0:
+            response.need_ack = bool(value)
+        elif field == 10 and wire_type == 2:
+            response.push_server = _decodeString(buf, value)
+        elif field == 11 and wire_type == 2:
+            response.live_cursor = _decodeString(buf, value)
+        elif field == 12 and wire_type == 0:
+            response.history_no_more = bool(value)
+    return response
+
+
+def scanAck(data):
+    """
+    只读取Response中回复ack需要的字段，消息列表整体跳过，可在完整扫描前先回复ack
+    :param data: Response的protobuf编码
+    :return: (need_ack, internal_ext的原始bytes)
+    """
+    buf = memoryview(data)
+    need_ack = False
+    internal_ext = b''
+    for field, wire_type, value in iterFields(buf):
+        if field == 5 and wire_type == 2:
+            internal_ext = bytes(buf[value[0]:value[1]])
+        elif field == 9 and wire_type == 0:
+            need_ack = bool(value)
+    return need_ack, internal_ext
+
+
+def encodeVarint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+# PushFrame字段2 log_id、字段8 payload的tag，以及字段7 payload_type='ack'的完整编码
+_ACK_LOG_ID_TAG = b'\x10'
+_ACK_PAYLOAD_TYPE = b'\x3a\x03ack'
+_ACK_PAYLOAD_TAG = b'\x42'
+
+
+def encodeAck(log_id, internal_ext):
+    """
+    直接拼出ack帧，与PushFrame(log_id=log_id, payload_type='ack', payload=internal_ext).SerializeToString()一致
+    :param log_id: 收到的PushFrame.log_id
+    :param internal_ext: Response.internal_ext的原始bytes
+    :return: ack帧
+    """
+    parts = []
+    if log_id:
+        parts.append(_ACK_LOG_ID_TAG)
+        parts.append(encodeVarint(log_id & 0xffffffffffffffff))
+    parts.append(_ACK_PAYLOAD_TYPE)
+    if internal_ext:
+        parts.append(_ACK_PAYLOAD_TAG)
+        parts.append(encodeVarint(len(internal_ext)))
+        parts.append(internal_ext)
+    return b''.join(parts)
+
+
+# ---------------------------------------------------------------------------
+# fast解析后端：根据betterproto结构体的字段定义预先生成专用解析表，
+# 热点结构体直接在protobuf编码上解析，结果字段与betterproto完全一致
+# ---------------------------------------------------------------------------
+
+# 热点结构体，嵌套在其中的这些结构体同样走fast解析，其余嵌套结构体延迟到首次访问时再用betterproto解析
+FAST_TYPES = (PushFrame, ChatMessage, GiftMessage, MemberMessage, LikeMessage, SocialMessage,
+              User, Common, GiftStruct)
+
+_VARINT_KINDS = {
+    betterproto.TYPE_UINT32: 'uint', betterproto.TYPE_UINT64: 'uint', betterproto.TYPE_ENUM: 'uint',
+    betterproto.TYPE_INT32: 'int32', betterproto.TYPE_INT64: 'int64',
+    betterproto.TYPE_SINT32: 'sint', betterproto.TYPE_SINT64: 'sint',
+    betterproto.TYPE_BOOL: 'bool',
+}
+_FIXED_FORMATS = {
+    betterproto.TYPE_FIXED32: ('<I', 4), betterproto.TYPE_SFIXED32: ('<i', 4), betterproto.TYPE_FLOAT: ('<f', 4),
+    betterproto.TYPE_FIXED64: ('<Q', 8), betterproto.TYPE_SFIXED64: ('<q', 8), betterproto.TYPE_DOUBLE: ('<d', 8),
+}
+
+
+class FastMessage:
+    """
+    fast后端解析出的结构体，属性与对应的betterproto结构体同名同值。
+    编码中没有出现的字段在首次访问时返回默认值，非热点的嵌套结构体先保留原始bytes，首次访问时才解析
+    """
+    _source = None
+    _defaults = {}
+    _lazy_types = {}
+
+    def __getattr__(self, name):
+        # 只有实例__dict__中没有该属性时才会调用到这里
+        d = self.__dict__
+        lazy = d.get('_lazy')
+        if lazy is not None and name in lazy:
+            raw = lazy.pop(name)
+            message_type = self._lazy_types[name]
+            if isinstance(raw, list):
+                value = [message_type().parse(item) for item in raw]
+            else:
+                value = message_type().parse(raw)
+                value._serialized_on_wire = True
+            d[name] = value
+            return value
+        factory = self._defaults.get(name)
+        if factory is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        value = factory()
+        d[name] = value
+        return value
+
+    def toBetterproto(self):
+        """
+        转换为对应的betterproto结构体
+        """
+        kwargs = {}
+        for name in self._defaults:
+            value = getattr(self, name)
+            if isinstance(value, FastMessage):
+                value = value.toBetterproto()
+            elif isinstance(value, list):
+                value = [v.toBetterproto() if isinstance(v, FastMessage) else v for v in value]
+            kwargs[name] = value
+        return self._source(**kwargs)
+
+    def __eq__(self, other):
+        if isinstance(other, FastMessage):
+            other = other.toBetterproto()
+        return self.toBetterproto() == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # 动态生成的类无法直接pickle，按对应的betterproto类型重建，供多进程间传递事件
+        return _rebuildFast, (self._source, self.__dict__)
+
+    def __repr__(self):
+        fields = ', '.join(f"{k}={v!r}" for k, v in self.__dict__.items() if not k.startswith('_'))
+        return f"{type(self).__name__}({fields})"
+
+
+_fast_classes = {}
+_fast_decoders = {}
+# 已生成完整解析表的结构体，解析线程只读取这里
+_fast_ready = {}
+_compile_lock = threading.RLock()
+
+
+def _rebuildFast(message_type, state):
+    _prepareFast(message_type)
+    fast_cls = _fast_classes[message_type]
+    obj = fast_cls.__new__(fast_cls)
+    obj.__dict__.update(state)
+    return obj
+
+
+def _compileFast(message_type):
+    """
+    为betterproto结构体生成fast解析函数
+    :return: decode(data) -> FastMessage
+    """
+    if message_type in _fast_decoders:
+        return _fast_decoders[message_type]
+    meta = message_type()._betterproto
+    defaults = {}
+    lazy_types = {}
+    spec = {}
+    fast_cls = type('Fast' + message_type.__name__, (FastMessage,), {
+        '_source': message_type, '_defaults': defaults, '_lazy_types': lazy_types,
+    })
+    _fast_classes[message_type] = fast_cls
+
+    def decode(data):
+        return _decodeFast(fast_cls, spec, data)
+
+    # 先登记再生成字段表，支持结构体间的相互嵌套
+    _fast_decoders[message_type] = decode
+    for name, field_meta in meta.meta_by_field_name.items():
+        proto_type = field_meta.proto_type
+        default_gen = meta.default_gen[name]
+        repeated = isinstance(default_gen(), list)
+        if proto_type == betterproto.TYPE_MESSAGE:
+            sub_type = meta.cls_by_field[name]
+            defaults[name] = default_gen
+            if sub_type in FAST_TYPES:
+                spec[field_meta.number] = (name, 'fast', repeated, _compileFast(sub_type))
+            else:
+                lazy_types[name] = sub_type
+                spec[field_meta.number] = (name, 'lazy', repeated, None)
+        elif proto_type == betterproto.TYPE_MAP:
+            raise NotImplementedError(f"{message_type.__name__}.{name}: map field")
+        else:
+            defaults[name] = default_gen
+            if proto_type in _VARINT_KINDS:
+                spec[field_meta.number] = (name, _VARINT_KINDS[proto_type], repeated, None)
+            elif proto_type in _FIXED_FORMATS:
+                spec[field_meta.number] = (name, 'fixed', repeated, _FIXED_FORMATS[proto_type])
+            else:
+                spec[field_meta.number] = (name, proto_type, repeated, None)
+    return decode
+
+
+def _varintValue(kind, value):
+    if kind == 'uint':
+        return value
+    if kind == 'bool':
+        return value > 0
+    if kind == 'int64':
+        return value - _UINT64 if value >= _INT64_SIGN else value
+    if kind == 'int32':
+        value &= 0xffffffff
+        return value - 0x100000000 if value >= 0x80000000 else value
+    return (value >> 1) ^ (-(value & 1))
+
+
+def _decodeFast(fast_cls, spec, data):
+    obj = fast_cls.__new__(fast_cls)
+    d = obj.__dict__
+    pos = 0
+    end = len(data)
+    while pos < end:
+        b = data[pos]
+        if b < 0x80:
+            key = b
+            pos += 1
+        else:
+            key, pos = readVarint(data, pos)
+        wire_type = key & 7
+        field = spec.get(key >> 3)
+        if wire_type == 0:
+            b = data[pos]
+            if b < 0x80:
+                value = b
+                pos += 1
+            else:
+                value, pos = readVarint(data, pos)
+            if field is None:
+                continue
+            name, kind, repeated, _ = field
+            value = _varintValue(kind, value)
+        elif wire_type == 2:
+            b = data[pos]
+            if b < 0x80:
+                length = b
+                pos += 1
+            else:
+                length, pos = readVarint(data, pos)
+            start = pos
+            pos += length
+            if field is None:
+                continue
+            name, kind, repeated, sub = field
+            if kind == 'string':
+                value = str(data[start:pos], 'utf-8')
+            elif kind == 'bytes':
+                value = data[start:pos]
+            elif kind == 'fast':
+                value = sub(data[start:pos])
+            elif kind == 'lazy':
+                lazy = d.get('_lazy')
+                if lazy is None:
+                    lazy = d['_lazy'] = {}
+                if repeated:
+                    lazy.setdefault(name, []).append(data[start:pos])
+                else:
+                    lazy[name] = data[start:pos]
+                continue
+            elif repeated:
+                # packed编码的数值数组
+                values = d.setdefault(name, [])
+                sub_pos = start
+                while sub_pos < pos:
+                    if kind == 'fixed':
+                        fmt, size = sub
+                        values.append(struct.unpack_from(fmt, data, sub_pos)[0])
+                        sub_pos += size
+                    else:
+                        value, sub_pos = readVarint(data, sub_pos)
+                        values.append(_varintValue(kind, value))
+                continue
+            else:
+                continue
+        elif wire_type == 1 or wire_type == 5:
+            size = 8 if wire_type == 1 else 4
+            start = pos
+            pos += size
+            if field is None:
+                continue
+            name, kind, repeated, sub = field
+            if kind != 'fixed':
+                continue
+            value = struct.unpack_from(sub[0], data, start)[0]
+        else:
+            raise DecodeError(f"unsupported wire type {wire_type}")
+        if repeated:
+            values = d.get(name)
+            if values is None:
+                d[name] = [value]
+            else:
+                values.append(value)
+        else:
+            d[name] = value
+    if pos > end:
+        raise DecodeError("truncated message")
+    return obj
+
+
+def parseBetterproto(message_type, data):
+    return message_type().parse(data)
+
+
+def parseFast(message_type, data):
+    """
+    热点结构体走fast解析，其余仍用betterproto
+    """
+    decoder = _fast_ready.get(message_type)
+    if decoder is None:
+        if message_type not in FAST_TYPES:
+            return message_type().parse(data)
+        decoder = _prepareFast(message_type)
+    return decoder(bytes(data))
+
+
+def _prepareFast(message_type):
+    """
+    首次解析某个热点结构体时才生成解析表，不使用fast后端时import不产生这部分开销
+    """
+    with _compile_lock:
+        decoder = _compileFast(message_type)
+        # 递归生成的嵌套结构体此时也已完整
+        _fast_ready.update(_fast_decoders)
+    return decoder
+
+
+# 解析后端名称 -> parse(结构体类, 数据)
+DECODER_BACKENDS = {
+    'betterproto': parseBetterproto,
+    'fast': parseFast,
+}
+
+
+def getParser(backend='betterproto'):
+    """
+    获取解析函数
+    :param backend: 'betterproto' 或 'fast'
+    :return: parse(结构体类, 数据)
+    """
+    try:
+        return DECODER_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"unknown decoder backend {backend!r}, choose from {sorted(DECODER_BACKENDS)}")
@@ -0,0 +1,314 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    ingest.py
+# @Time:        2025/2/27 21:45
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+接收与处理之间的有界队列：接收线程解析出消息列表并回复ack后只负责入队，
+消息处理与sink输出在单独的线程中进行。处理跟不上时按策略丢弃消息，而不是拖慢ack导致被服务端断开：
+    ingest = IngestQueue(maxsize=20000, policy='drop-by-method', on_high_water=print)
+    DouyinLiveWebFetcher(live_id, ingest=ingest).start()
+"""
+
+import threading
+from collections import Counter, deque
+
+# 队列满时的处理策略
+POLICIES = ('block', 'drop-oldest', 'drop-newest', 'drop-by-method')
+
+# drop-by-method策略下优先丢弃的消息
+DEFAULT_DROP_METHODS = ('WebcastMemberMessage', 'WebcastLikeMessage', 'WebcastRoomUserSeqMessage',
+                        'WebcastRoomStatsMessage', 'WebcastRoomRankMessage')
+
+
+class IngestQueue:
+
+    def __init__(self, maxsize=10000, policy='drop-oldest', drop_methods=DEFAULT_DROP_METHODS, high_water=0.8,
+                 on_high_water=None):
+        """
+        :param maxsize: 队列中最多缓存的消息数
+        :param policy: 队列满时的策略：
+                       'block' 接收线程等待（asyncio抓取对象中会阻塞事件循环，不建议使用），
+                       'drop-oldest' 丢弃最早的消息，'drop-newest' 丢弃新到的消息，
+                       'drop-by-method' 优先丢弃drop_methods中的消息，没有可丢弃的再丢弃最早的消息
+        :param drop_methods: drop-by-method策略下可丢弃的消息类别
+        :param high_water: 队列长度达到maxsize的该比例时调用on_high_water，降到一半以下后重新触发
+        :param on_high_water: on_high_water(depth, maxsize)，在接收线程中调用
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown ingest policy {policy!r}, choose from {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.drop_methods = frozenset(drop_methods) if policy == 'drop-by-method' else frozenset()
+        self.high_water = max(1, int(maxsize * high_water))
+        self.on_high_water = on_high_water
+        self.dropped = Counter()
+        self.enqueued = 0
+        self.max_depth = 0
+        self.high_water_events = 0
+        # 可丢弃的消息单独排队，用序号保证整体仍按到达顺序处理
+        self._essential = deque()
+        self._sheddable = deque()
+        self._seq = 0
+        self._above_high_water = False
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def __len__(self):
+        return len(self._essential) + len(self._sheddable)
+
+    def put(self, msg, arrival, server_now):
+        """
+        消息入队
+        :param msg: Response中的消息
+        :param arrival: 收到该帧的本地时间
+        :param server_now: Response.now
+        :return: 是否入队，被丢弃时返回False
+        """
+        method = msg.method
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self) >= self.maxsize:
+                if self.policy == 'block':
+                    while len(self) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return False
+                elif self.policy == 'drop-newest' or method in self.drop_methods:
+                    self.dropped[method] += 1
+                    return False
+                else:
+                    victim = self._sheddable.popleft() if self._sheddable else self._popOldest()
+                    self.dropped[victim[1].method] += 1
+            self._seq += 1
+            item = (self._seq, msg, arrival, server_now)
+            if method in self.drop_methods:
+                self._sheddable.append(item)
+            else:
+                self._essential.append(item)
+            self.enqueued += 1
+            depth = len(self)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._cond.notify_all()
+            crossed = False
+            if depth >= self.high_water and not self._above_high_water:
+                self._above_high_water = crossed = True
+                self.high_water_events += 1
+        if crossed and self.on_high_water is not None:
+            self.on_high_water(depth, self.maxsize)
+        return True
+
+    def _popOldest(self):
+        essential = self._essential
+        sheddable = self._sheddable
+        if not sheddable or (essential and essential[0][0] < sheddable[0][0]):
+            return essential.popleft()
+        return sheddable.popleft()
+
+    def get(self, timeout=None):
+        """
+        :return: (msg, arrival, server_now)，队列已关闭且为空或超时时返回None
+        """
+        with self._cond:
+            while not len(self):
+                if self._closed or not self._cond.wait(timeout):
+                    return None
+            _, msg, arrival, server_now = self._popOldest()
+            if self._above_high_water and len(self) < self.high_water // 2:
+                self._above_high_water = False
+            self._cond.notify_all()
+            return msg, arrival, server_now
+
+    def start(self, consume):
+        """
+        启动处理线程
+        :param consume: consume(msg, arrival, server_now)
+        """
+        if self._thread is not None:
+            # 处理线程只会把消息交给第一个抓取对象，共用后事件的直播间会错乱，且一个直播间停止时会关闭所有直播间的队列
+            raise ValueError("IngestQueue is already used by another fetcher, "
+                             "pass a factory such as functools.partial(IngestQueue, maxsize=20000) instead")
+        self._thread = threading.Thread(target=self._consumeLoop, args=(consume,), name='ingest', daemon=True)
+        self._thread.start()
+
+    def _consumeLoop(self, consume):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            try:
+                consume(*item)
+            except Exception as err:
+                print("【X】Ingest consume error: ", err)
+
+    def close(self, wait=True):
+        """
+        停止接收，处理线程处理完队列中剩余的消息后退出
+        :param wait: 是否等待剩余消息处理完
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        thread = self._thread
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def inConsumerThread(self):
+        """
+        当前线程是否为处理线程
+        """
+        return self._thread is not None and self._thread is threading.current_thread()
+
+    def stats(self):
+        return {
+            "depth": len(self),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dropped": sum(self.dropped.values()),
+            "dropped_by_method": dict(self.dropped),
+            "high_water_events": self.high_water_events,
+        }
+
+
+class Lane:
+
+    def __init__(self, name, methods=None, weight=1, maxsize=1000, coalesce=()):
+        """
+        优先级通道
+        :param name: 通道名
+        :param methods: 进入该通道的消息类别，None表示未被其他通道认领的消息都进入该通道
+        :param weight: 每轮调度中该通道可处理的消息数，None表示严格优先，有消息时总是先处理
+        :param maxsize: 通道容量，满时丢弃该通道中最早的消息
+        :param coalesce: 只保留最新一条的消息类别（如在线人数等状态类消息），新消息直接覆盖队列中尚未处理的旧消息
+        """
+        # 权重为0的通道永远分不到处理额度，消息会一直积压
+        if weight is not None and weight < 1:
+            raise ValueError(f"lane {name!r} weight must be >= 1 or None, got {weight!r}")
+        self.name = name
+        self.methods = frozenset(methods) if methods is not None else None
+        self.weight = weight
+        self.maxsize = maxsize
+        self.coalesce = frozenset(coalesce)
+        self.items = deque()
+        self.credits = weight or 0
+        self.dropped = 0
+        self.coalesced = 0
+        # 待处理的可合并消息：method -> 队列中的item
+        self.pending = {}
+
+
+def defaultLanes():
+    """
+    默认通道：直播间状态消息严格优先；聊天、礼物等高价值消息权重最高；
+    进场、点赞数量巨大、价值低，容量小，过载时最先被丢弃
+    """
+    return [
+        Lane('control', ('WebcastControlMessage',), weight=None, maxsize=1000),
+        Lane('high', ('WebcastChatMessage', 'WebcastGiftMessage', 'WebcastEmojiChatMessage', 'WebcastSocialMessage',
+                      'WebcastFansclubMessage'), weight=8, maxsize=10000),
+        Lane('low', ('WebcastMemberMessage', 'WebcastLikeMessage'), weight=1, maxsize=2000),
+        Lane('state', None, weight=2, maxsize=1000,
+             coalesce=('WebcastRoomUserSeqMessage', 'WebcastRoomStatsMessage', 'WebcastRoomRankMessage')),
+    ]
+
+
+class LaneQueue(IngestQueue):
+
+    def __init__(self, lanes=None, high_water=0.8, on_high_water=None):
+        """
+        按消息类别分通道的有界队列，接口与IngestQueue相同。
+        处理线程按权重轮流从各通道取消息，严格优先的通道总是先处理；各通道独立限额，
+        低价值消息再多也不会挤占聊天、礼物与直播结束消息
+        :param lanes: Lane列表，默认defaultLanes()
+        :param high_water: 总长度达到总容量的该比例时调用on_high_water
+        """
+        self.lanes = lanes if lanes is not None else defaultLanes()
+        super().__init__(sum(lane.maxsize for lane in self.lanes), 'drop-oldest', (), high_water, on_high_water)
+        self._lane_by_method = {}
+        self._default_lane = None
+        for lane in self.lanes:
+            if lane.methods is None:
+                self._default_lane = lane
+            else:
+                for method in lane.methods:
+                    self._lane_by_method.setdefault(method, lane)
+        if self._default_lane is None:
+            self._default_lane = self.lanes[-1]
+        self._strict = [lane for lane in self.lanes if lane.weight is None]
+        self._weighted = [lane for lane in self.lanes if lane.weight is not None]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def put(self, msg, arrival, server_now):
+        method = msg.method
+        lane = self._lane_by_method.get(method, self._default_lane)
+        with self._cond:
+            if self._closed:
+                return False
+            if method in lane.coalesce:
+                item = lane.pending.get(method)
+                if item is not None:
+                    # 覆盖队列中尚未处理的旧消息，位置不变
+                    item[1], item[2], item[3] = msg, arrival, server_now
+                    lane.coalesced += 1
+                    return True
+            if len(lane.items) >= lane.maxsize:
+                victim = self._popLane(lane)
+                lane.dropped += 1
+                self.dropped[victim[1].method] += 1
+            self._seq += 1
+            item = [self._seq, msg, arrival, server_now]
+            lane.items.append(item)
+            if method in lane.coalesce:
+                lane.pending[method] = item
+            self._size += 1
+            self.enqueued += 1
+            depth = self._size
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self._cond.notify_all()
+            crossed = False
+            if depth >= self.high_water and not self._above_high_water:
+                self._above_high_water = crossed = True
+                self.high_water_events += 1
+        if crossed and self.on_high_water is not None:
+            self.on_high_water(depth, self.maxsize)
+        return True
+
+    def _popOldest(self):
+        """
+        按通道优先级与权重取下一条消息
+        """
+        for lane in self._strict:
+            if lane.items:
+                return self._popLane(lane)
+        for _ in range(2):
+            for lane in self._weighted:
+                if lane.items and lane.credits > 0:
+                    lane.credits -= 1
+                    return self._popLane(lane)
+            # 有消息的通道额度都用完了，开始新一轮
+            for lane in self._weighted:
+                lane.credits = lane.weight
+        raise IndexError('pop from empty LaneQueue')
+
+    def _popLane(self, lane):
+        item = lane.items.popleft()
+        if lane.pending.get(item[1].method) is item:
+            del lane.pending[item[1].method]
+        self._size -= 1
+        return item
+
+    def stats(self):
+        stats = super().stats()
+        stats["lanes"] = {lane.name: {"depth": len(lane.items), "dropped": lane.dropped, "coalesced": lane.coalesced}
+                          for lane in self.lanes}
+        return stats
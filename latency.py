@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    latency.py
+# @Time:        2025/2/10 20:31
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+端到端延迟统计：用消息的Common.create_time、Response.now与本地收帧/处理完成时间，
+把每条消息的延迟拆成三段：
+    server    = Response.now - create_time   服务端攒批、推送间隔造成的延迟
+    transport = 收到帧 - Response.now          网络传输（含本地与服务端的时钟偏差）
+    local     = 处理完成 - 收到帧               本地解压、解析、排队与事件处理
+    total     = 处理完成 - create_time
+server段很大而local段很小说明是服务端攒批，local段持续增长说明本地处理跟不上。
+
+    tracker = LatencyTracker(behind_threshold=10, on_behind=print)
+    DouyinLiveWebFetcher(live_id, latency=tracker).start()
+    tracker.snapshot()
+"""
+
+import bisect
+import threading
+import time
+
+LATENCY_STAGES = ('server', 'transport', 'local', 'total')
+
+# 延迟分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120, 300)
+
+
+class RollingHistogram:
+
+    def __init__(self, window=60, slices=6, buckets=LATENCY_BUCKETS):
+        """
+        滑动窗口直方图，窗口分成若干时间片轮转，过期时间片整体清零
+        :param window: 窗口长度（秒）
+        :param slices: 时间片数量
+        :param buckets: 分桶上界
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.slice_seconds = window / slices
+        self._slices = [self._newSlice() for _ in range(slices)]
+        self._epochs = [-1] * slices
+        self._lock = threading.Lock()
+
+    def _newSlice(self):
+        # [各分桶计数..., 总数, 总和, 最大值]
+        return [0] * (len(self.buckets) + 1) + [0, 0.0, 0.0]
+
+    def _current(self, now):
+        epoch = int(now // self.slice_seconds)
+        index = epoch % len(self._slices)
+        if self._epochs[index] != epoch:
+            self._slices[index] = self._newSlice()
+            self._epochs[index] = epoch
+        return self._slices[index]
+
+    def observe(self, value, now=None):
+        now = time.time() if now is None else now
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            current = self._current(now)
+            current[index] += 1
+            current[-3] += 1
+            current[-2] += value
+            if value > current[-1]:
+                current[-1] = value
+
+    def snapshot(self, now=None):
+        """
+        :return: 窗口内的 count、mean、max 及 p50/p90/p99（取所在分桶上界）
+        """
+        now = time.time() if now is None else now
+        oldest = int(now // self.slice_seconds) - len(self._slices) + 1
+        size = len(self.buckets) + 1
+        counts = [0] * size
+        total = 0
+        value_sum = 0.0
+        value_max = 0.0
+        with self._lock:
+            for epoch, current in zip(self._epochs, self._slices):
+                if epoch < oldest:
+                    continue
+                for i in range(size):
+                    counts[i] += current[i]
+                total += current[-3]
+                value_sum += current[-2]
+                value_max = max(value_max, current[-1])
+        result = {"count": total, "mean": value_sum / total if total else 0.0, "max": value_max}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            result[name] = self._quantile(counts, total, q, value_max)
+        return result
+
+    def _quantile(self, counts, total, q, value_max):
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, value_max)
+        return value_max
+
+
+class LatencyTracker:
+
+    def __init__(self, window=60, slices=6, behind_threshold=10, on_behind=None, alarm_interval=30,
+                 buckets=LATENCY_BUCKETS):
+        """
+        按直播间、消息类别统计端到端延迟
+        :param window: 滑动窗口长度（秒）
+        :param slices: 窗口时间片数量
+        :param behind_threshold: 总延迟超过该秒数时触发on_behind
+        :param on_behind: 落后告警回调，参数为dict：live_id、method、behind（秒）以及server/transport/local三段延迟
+        :param alarm_interval: 同一直播间两次告警的最小间隔（秒）
+        """
+        self.window = window
+        self.slices = slices
+        self.behind_threshold = behind_threshold
+        self.on_behind = on_behind
+        self.alarm_interval = alarm_interval
+        self.buckets = buckets
+        self.alarms = 0
+        self._histograms = {}
+        self._last_alarm = {}
+        self._behind = {}
+        self._lock = threading.Lock()
+
+    def _histogramsFor(self, live_id, method):
+        key = (live_id, method)
+        histograms = self._histograms.get(key)
+        if histograms is None:
+            with self._lock:
+                histograms = self._histograms.get(key)
+                if histograms is None:
+                    histograms = self._histograms[key] = tuple(
+                        RollingHistogram(self.window, self.slices, self.buckets) for _ in LATENCY_STAGES)
+        return histograms
+
+    def observe(self, live_id, method, create_time, server_now, arrival, done=None):
+        """
+        记录一条消息的延迟
+        :param create_time: Common.create_time，毫秒
+        :param server_now: Response.now，毫秒，为0时不统计server与transport段
+        :param arrival: 收到帧的本地时间（秒）
+        :param done: 处理完成的本地时间（秒），默认当前时间
+        """
+        if not create_time:
+            return
+        done = time.time() if done is None else done
+        created = create_time / 1000
+        server, transport, local, total = self._histogramsFor(live_id, method)
+        local_lag = done - arrival
+        total_lag = done - created
+        local.observe(local_lag, done)
+        total.observe(total_lag, done)
+        server_lag = transport_lag = None
+        if server_now:
+            sent = server_now / 1000
+            server_lag = sent - created
+            transport_lag = arrival - sent
+            server.observe(server_lag, done)
+            transport.observe(transport_lag, done)
+        self._behind[live_id] = total_lag
+        if self.on_behind is not None and total_lag >= self.behind_threshold:
+            if done - self._last_alarm.get(live_id, 0) >= self.alarm_interval:
+                self._last_alarm[live_id] = done
+                self.alarms += 1
+                self.on_behind({"live_id": live_id, "method": method, "behind": total_lag,
+                                "server": server_lag, "transport": transport_lag, "local": local_lag})
+
+    def behind(self, live_id):
+        """
+        :return: 该直播间最近一条消息的总延迟（秒），没有数据时为None
+        """
+        return self._behind.get(live_id)
+
+    def snapshot(self, now=None):
+        """
+        :return: {(live_id, method): {stage: 窗口统计}}
+        """
+        with self._lock:
+            items = list(self._histograms.items())
+        return {key: {stage: histogram.snapshot(now) for stage, histogram in zip(LATENCY_STAGES, histograms)}
+                for key, histograms in items}
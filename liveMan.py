@@ -6,27 +6,32 @@
 # @Author:      bubu
 # @Project:     douyinLiveWebFetcher
 
-import codecs
 import gzip
-import hashlib
 import random
-import re
-import string
-import subprocess
-import urllib.parse
+import threading
+import time
 from contextlib import contextmanager
-from py_mini_racer import MiniRacer
-from unittest.mock import patch
-
-import execjs
-import requests
-import websocket
+from urllib.parse import quote
 
+from events import (ChatEvent, ControlEvent, EmojiChatEvent, FansclubEvent, GiftEvent, LikeEvent, MemberEvent,
+                    RankEvent, RoomEvent, RoomStatsEvent, RoomUserSeqEvent, SocialEvent)
+from frameDecoder import encodeAck, getParser, scanAck, scanResponse
+from pipeline import DecodePipeline
 from protobuf.douyin import *
+from resolver import generateMsToken, getResolver
+from signer import generateSignMd5, getSignatureCache, getSigner
+from sinks import ConsoleSink
+
+# websocket.ABNF.OPCODE_BINARY，websocket模块在建连时才导入
+OPCODE_BINARY = 0x2
 
 
 @contextmanager
 def patched_popen_encoding(encoding='utf-8'):
+    # 只有sign_v0.js的execjs方式需要，用到时再导入
+    import subprocess
+    from unittest.mock import patch
+    
     original_popen_init = subprocess.Popen.__init__
     
     def new_popen_init(self, *args, **kwargs):
@@ -41,71 +46,210 @@ def generateSignature(wss, script_file='sign.js'):
     """
     出现gbk编码问题则修改 python模块subprocess.py的源码中Popen类的__init__函数参数encoding值为 "utf-8"
     """
-    params = ("live_id,aid,version_code,webcast_sdk_version,"
-              "room_id,sub_room_id,sub_channel_id,did_rule,"
-              "user_unique_id,device_platform,device_type,ac,"
-              "identity").split(',')
-    wss_params = urllib.parse.urlparse(wss).query.split('&')
-    wss_maps = {i.split('=')[0]: i.split("=")[-1] for i in wss_params}
-    tpl_params = [f"{i}={wss_maps.get(i, '')}" for i in params]
-    param = ','.join(tpl_params)
-    md5 = hashlib.md5()
-    md5.update(param.encode())
-    md5_param = md5.hexdigest()
-    
-    with codecs.open(script_file, 'r', encoding='utf8') as f:
-        script = f.read()
-        
-    ctx = MiniRacer()
-    ctx.eval(script)
+    md5_param = generateSignMd5(wss)
+    
+    # 重连同一直播间时md5不变，优先使用缓存的signature
+    cache = getSignatureCache()
+    signature = cache.get(md5_param)
+    if signature:
+        return signature
     
     try:
-        signature = ctx.call("get_sign", md5_param)
+        signature = getSigner(script_file).getSign(md5_param)
+        cache.put(md5_param, signature)
         return signature
     except Exception as e:
         print(e)
     
     # 以下代码对应js脚本为sign_v0.js
+    # import execjs
     # context = execjs.compile(script)
     # with patched_popen_encoding(encoding='utf-8'):
     #     ret = context.call('getSign', {'X-MS-STUB': md5_param})
     # return ret.get('X-Bogus')
 
 
-def generateMsToken(length=107):
-    """
-    产生请求头部cookie中的msToken字段，其实为随机的107位字符
-    :param length:字符位数
-    :return:msToken
-    """
-    random_str = ''
-    base_str = string.ascii_letters + string.digits + '=_'
-    _len = len(base_str) - 1
-    for _ in range(length):
-        random_str += base_str[random.randint(0, _len)]
-    return random_str
-
-
 class DouyinLiveWebFetcher:
     
-    def __init__(self, live_id):
+    def __init__(self, live_id, sign_func=None, methods=None, decoder='betterproto',
+                 pipeline_workers=0, pipeline_executor='thread', sinks=None, recorder=None, metrics=None,
+                 latency=None, user_table=None, dedup=None, reconnect=True, backoff_base=0.5,
+                 backoff_max=30, cache=None, resolver=None, ingest=None):
         """
         直播间弹幕抓取对象
         :param live_id: 直播间的直播id，打开直播间web首页的链接如：https://live.douyin.com/261378947940，
                         其中的261378947940即是live_id
+        :param sign_func: wss链接签名函数，默认为本进程内的generateSignature，
+                          多实例部署时可传入signServer.SignClient(...).generateSignature共用签名服务
+        :param methods: 订阅的消息类别，如['WebcastChatMessage', 'WebcastGiftMessage']，
+                        默认订阅所有有处理函数的消息，未订阅的消息不会被解析
+        :param decoder: protobuf解析后端，'betterproto' 或 'fast'（热点结构体使用专用解析，见frameDecoder）
+        :param pipeline_workers: 大于0时开启流水线模式，接收线程解压并回复ack后，Response的扫描交由该数量的线程/进程处理，
+                                 解析结果按到达顺序分发，适用于消息量很大的直播间
+        :param pipeline_executor: 流水线使用'thread'线程池或'process'进程池
+        :param sinks: 事件输出列表，见sinks.py，默认按原有格式输出到控制台
+        :param recorder: recorder.FrameRecorder，录制收到的原始帧，之后可用recorder.replay离线回放
+        :param metrics: metrics.FetcherMetrics，开启帧数、解析耗时、ack耗时、处理异常等指标统计
+        :param latency: latency.LatencyTracker，按消息的create_time统计端到端延迟并在落后时告警
+        :param user_table: users.UserTable，事件中的user改为共用的精简观众记录，减少长时间运行的内存占用
+        :param dedup: dedup.MsgIdDeduper，按msg_id跳过重连、补发造成的重复消息，在解析消息体之前判断
+        :param reconnect: 连接断开后是否自动重连，重连时复用ttwid、room_id与签名，并从最后收到的cursor继续
+        :param backoff_base: 重连等待的初始上限（秒），每次失败翻倍，实际等待时间在0到上限之间随机
+        :param backoff_max: 重连等待的最大上限（秒）
+        :param cache: roomCache.RoomCache，ttwid与room_id的磁盘缓存，多个进程可共用，缓存有效时不再请求直播间页面
+        :param resolver: resolver.RoomResolver，请求ttwid与room_id使用的解析器，默认为进程内共用的带连接池的解析器
+        :param ingest: ingest.IngestQueue，接收与处理之间的有界队列，处理跟不上时按策略丢弃消息，不影响ack；
+                       队列只能由一个抓取对象使用，多个直播间共用参数时传入工厂函数，
+                       如functools.partial(IngestQueue, maxsize=20000)，每个抓取对象各创建一个队列
         """
         self.__ttwid = None
         self.__room_id = None
         self.live_id = live_id
+        self.sign_func = sign_func or generateSignature
+        self.decoder = decoder
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink()]
+        self.recorder = recorder
+        self.metrics = metrics.forRoom(live_id) if metrics is not None else None
+        self._parse = getParser(decoder)
+        if self.metrics is not None:
+            self._parse = self.metrics.timedParser(self._parse)
+        self._connects = 0
+        self.latency = latency
+        self.user_table = user_table
+        self.dedup = dedup
+        self.cache = cache
+        self.resolver = resolver or getResolver()
+        if callable(ingest):
+            ingest = ingest()
+        self.ingest = ingest
+        if ingest is not None:
+            ingest.start(self._consumeIngest)
+        self.reconnect = reconnect
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # 断线重连用的状态：最后收到的Response.cursor/internal_ext与已生成的签名
+        self._cursor = None
+        self._internal_ext = None
+        self._signature = None
+        self._signature_md5 = None
+        self._stopped = False
+        # stop()时唤醒重连前的等待
+        self._stop_event = threading.Event()
+        self.ws = None
+        self._attempts = 0
+        self._received = False
+        # 当前正在分发的帧的本地接收时间与Response.now，供延迟统计使用
+        self._frame_arrival = 0.0
+        self._server_now = 0
+        self._pipeline = None
+        if pipeline_workers > 0:
+            self._pipeline = DecodePipeline(self._onPipelineDecoded, pipeline_workers, pipeline_executor)
         self.live_url = "https://live.douyin.com/"
         self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) " \
                           "Chrome/120.0.0.0 Safari/537.36"
+        self._handlers = {
+            'WebcastChatMessage': self._parseChatMsg,  # 聊天消息
+            'WebcastGiftMessage': self._parseGiftMsg,  # 礼物消息
+            'WebcastLikeMessage': self._parseLikeMsg,  # 点赞消息
+            'WebcastMemberMessage': self._parseMemberMsg,  # 进入直播间消息
+            'WebcastSocialMessage': self._parseSocialMsg,  # 关注消息
+            'WebcastRoomUserSeqMessage': self._parseRoomUserSeqMsg,  # 直播间统计
+            'WebcastFansclubMessage': self._parseFansclubMsg,  # 粉丝团消息
+            'WebcastControlMessage': self._parseControlMsg,  # 直播间状态消息
+            'WebcastEmojiChatMessage': self._parseEmojiChatMsg,  # 聊天表情包消息
+            'WebcastRoomStatsMessage': self._parseRoomStatsMsg,  # 直播间统计信息
+            'WebcastRoomMessage': self._parseRoomMsg,  # 直播间信息
+            'WebcastRoomRankMessage': self._parseRankMsg,  # 直播间排行榜信息
+        }
+        self._subscribed = set(methods if methods is not None else self._handlers)
+        self._method_filter = self._buildMethodFilter()
     
     def start(self):
-        self._connectWebSocket()
+        self._stopped = False
+        self._stop_event.clear()
+        while not self._stopped:
+            self._received = False
+            self._connectWebSocket()
+            if self._stopped or not self.reconnect:
+                break
+            delay = self._nextBackoff()
+            print(f"【!】WebSocket disconnected, reconnecting in {delay:.1f}s")
+            self._stop_event.wait(delay)
     
     def stop(self):
-        self.ws.close()
+        self._stopped = True
+        self._stop_event.set()
+        self._closeOutputs()
+        if self.ws is not None:
+            self.ws.close()
+    
+    def _closeOutputs(self):
+        """
+        停止流水线与ingest，并把sink、录制文件中缓存的数据写出
+        """
+        # 先等流水线把已提交的帧交给ingest，再等ingest处理完，最后写出sink；在各自线程中调用时（如直播结束）不等待自己
+        if self.ingest is not None and self.ingest.inConsumerThread():
+            # 先关闭ingest，避免流水线阻塞在已满的block队列上与本线程互相等待
+            self.ingest.close()
+        if self._pipeline is not None:
+            self._pipeline.close()
+        if self.ingest is not None:
+            self.ingest.close()
+        for sink in self.sinks:
+            sink.flush()
+        if self.recorder is not None:
+            self.recorder.flush()
+    
+    def subscribe(self, *methods):
+        """
+        订阅消息类别，可在运行中调用
+        :param methods: 消息类别，如'WebcastChatMessage'
+        """
+        self._subscribed.update(methods)
+        self._method_filter = self._buildMethodFilter()
+    
+    def unsubscribe(self, *methods):
+        """
+        取消订阅消息类别，取消后该类消息在解压后直接跳过，不会解析消息体
+        :param methods: 消息类别，如'WebcastMemberMessage'
+        """
+        self._subscribed.difference_update(methods)
+        self._method_filter = self._buildMethodFilter()
+    
+    def _nextBackoff(self):
+        """
+        计算下一次重连前的等待时间，收到过数据的连接断开后从头计算
+        """
+        if self._received:
+            self._attempts = 0
+        else:
+            # 握手失败时签名可能已失效，从签名缓存中删除，下次重新签名
+            self._evictSignature()
+        self._attempts += 1
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (self._attempts - 1)))
+    
+    def _evictSignature(self):
+        """
+        丢弃当前签名；sign_func为SignClient.generateSignature时使用其自己的缓存
+        """
+        if self._signature_md5 is not None:
+            cache = getattr(getattr(self.sign_func, '__self__', None), 'cache', None) or getSignatureCache()
+            cache.delete(self._signature_md5)
+        self._signature = None
+        self._signature_md5 = None
+    
+    def _trackResume(self, response):
+        """
+        记录最新的cursor与internal_ext，重连时从这里继续拉取，避免漏消息或大量重复
+        """
+        if response.cursor:
+            self._cursor = response.cursor
+        if response.internal_ext:
+            self._internal_ext = response.internal_ext
+    
+    def _buildMethodFilter(self):
+        # 只保留订阅了且有处理函数的消息，过滤时直接比较Message.method的原始字节
+        return frozenset(m.encode('utf-8') for m in self._subscribed if m in self._handlers)
     
     @property
     def ttwid(self):
@@ -115,17 +259,14 @@ class DouyinLiveWebFetcher:
         """
         if self.__ttwid:
             return self.__ttwid
-        headers = {
-            "User-Agent": self.user_agent,
-        }
-        try:
-            response = requests.get(self.live_url, headers=headers)
-            response.raise_for_status()
-        except Exception as err:
-            print("【X】Request the live url error: ", err)
+        if self.cache is not None:
+            self.__ttwid = self.cache.getTtwid(self._fetchTtwid)
         else:
-            self.__ttwid = response.cookies.get('ttwid')
-            return self.__ttwid
+            self.__ttwid = self._fetchTtwid()
+        return self.__ttwid
+    
+    def _fetchTtwid(self):
+        return self.resolver.fetchTtwid()
     
     @property
     def room_id(self):
@@ -135,29 +276,25 @@ class DouyinLiveWebFetcher:
         """
         if self.__room_id:
             return self.__room_id
-        url = self.live_url + self.live_id
-        headers = {
-            "User-Agent": self.user_agent,
-            "cookie": f"ttwid={self.ttwid}&msToken={generateMsToken()}; __ac_nonce=0123407cc00a9e438deb4",
-        }
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-        except Exception as err:
-            print("【X】Request the live room url error: ", err)
+        if self.cache is not None:
+            self.__room_id = self.cache.getRoomId(self.live_id, self._fetchRoomId)
         else:
-            match = re.search(r'roomId\\":\\"(\d+)\\"', response.text)
-            if match is None or len(match.groups()) < 1:
-                print("【X】No match found for roomId")
-            
-            self.__room_id = match.group(1)
-            
-            return self.__room_id
+            self.__room_id = self._fetchRoomId()
+        return self.__room_id
     
-    def _connectWebSocket(self):
+    def _fetchRoomId(self):
+        return self.resolver.fetchRoomId(self.live_id, self.ttwid)
+    
+    def _buildWssUrl(self):
         """
-        连接抖音直播间websocket服务器，请求直播间数据
+        拼接并签名直播间websocket链接，重连时使用最后收到的cursor与internal_ext，签名只生成一次
+        :return: wss链接
         """
+        cursor = self._cursor or "d-1_u-1_fh-7392091211001140287_t-1721106114633_r-1"
+        internal_ext = self._internal_ext or (
+            f"internal_src:dim|wss_push_room_id:{self.room_id}|wss_push_did:7319483754668557238"
+            f"|first_req_ms:1721106114541|fetch_time:1721106114633|seq:1|wss_info:0-1721106114633-0-0|"
+            f"wrds_v:7392094459690748497")
         wss = ("wss://webcast5-ws-web-hl.douyin.com/webcast/im/push/v2/?app_name=douyin_web"
                "&version_code=180800&webcast_sdk_version=1.0.14-beta.0"
                "&update_version_code=1.0.14-beta.0&compress=gzip&device_platform=web&cookie_enabled=true"
@@ -166,16 +303,30 @@ class DouyinLiveWebFetcher:
                "&browser_version=5.0%20(Windows%20NT%2010.0;%20Win64;%20x64)%20AppleWebKit/537.36%20(KHTML,"
                "%20like%20Gecko)%20Chrome/126.0.0.0%20Safari/537.36"
                "&browser_online=true&tz_name=Asia/Shanghai"
-               "&cursor=d-1_u-1_fh-7392091211001140287_t-1721106114633_r-1"
-               f"&internal_ext=internal_src:dim|wss_push_room_id:{self.room_id}|wss_push_did:7319483754668557238"
-               f"|first_req_ms:1721106114541|fetch_time:1721106114633|seq:1|wss_info:0-1721106114633-0-0|"
-               f"wrds_v:7392094459690748497"
+               f"&cursor={quote(cursor, safe=':|,-_.')}"
+               f"&internal_ext={quote(internal_ext, safe=':|,-_.')}"
                f"&host=https://live.douyin.com&aid=6383&live_id=1&did_rule=3&endpoint=live_pc&support_wrds=1"
                f"&user_unique_id=7319483754668557238&im_path=/webcast/im/fetch/&identity=audience"
                f"&need_persist_msg_count=15&insert_task_id=&live_reason=&room_id={self.room_id}&heartbeatDuration=0")
         
-        signature = generateSignature(wss)
-        wss += f"&signature={signature}"
+        # 签名只与room_id等固定参数有关，与cursor无关，重连时直接复用
+        if self._signature is None:
+            start = time.perf_counter()
+            self._signature = self.sign_func(wss)
+            self._signature_md5 = generateSignMd5(wss)
+            if self.metrics is not None:
+                self.metrics.signature_seconds.observe(time.perf_counter() - start)
+        wss += f"&signature={self._signature}"
+        return wss
+    
+    def _connectWebSocket(self):
+        """
+        连接抖音直播间websocket服务器，请求直播间数据
+        """
+        import websocket
+        
+        wss = self._buildWssUrl()
+        self._countConnect()
         
         headers = {
             "cookie": f"ttwid={self.ttwid}",
@@ -193,6 +344,11 @@ class DouyinLiveWebFetcher:
             self.stop()
             raise
     
+    def _countConnect(self):
+        self._connects += 1
+        if self._connects > 1 and self.metrics is not None:
+            self.metrics.reconnects.inc()
+    
     def _wsOnOpen(self, ws):
         """
         连接建立成功
@@ -206,38 +362,133 @@ class DouyinLiveWebFetcher:
         :param message: 数据
         """
         
-        # 根据proto结构体解析对象
-        package = PushFrame().parse(message)
-        response = Response().parse(gzip.decompress(package.payload))
+        arrival, package = self._receiveFrame(message)
+        data = self._decompress(package.payload)
+        
+        # 返回直播间服务器链接存活确认消息，便于持续获取数据；
+        # 只读出need_ack与internal_ext就先回复，ack延迟不随帧中消息数量增长，也不必等流水线中积压的帧
+        need_ack, internal_ext = scanAck(data)
+        if need_ack:
+            self._sendAck(ws, package.log_id, internal_ext)
+        
+        # 流水线模式下Response的扫描交给线程池/进程池
+        if self._pipeline is not None:
+            self._pipeline.submit(data, arrival, self._method_filter, self.decoder)
+            return
         
-        # 返回直播间服务器链接存活确认消息，便于持续获取数据
-        if response.need_ack:
-            ack = PushFrame(log_id=package.log_id,
-                            payload_type='ack',
-                            payload=response.internal_ext.encode('utf-8')
-                            ).SerializeToString()
-            ws.send(ack, websocket.ABNF.OPCODE_BINARY)
+        self._processResponse(self._scanResponse(data), arrival)
+    
+    def _receiveFrame(self, message):
+        """
+        录制、统计并解析收到的帧
+        :return: (本地接收时间, PushFrame)
+        """
+        arrival = time.time()
+        self._received = True
+        if self.recorder is not None:
+            self.recorder.write(message, arrival)
+        if self.metrics is not None:
+            self.metrics.frames.inc()
+            self.metrics.bytes.inc(len(message))
         
-        # 根据消息类别解析消息体
-        for msg in response.messages_list:
-            method = msg.method
+        # 根据proto结构体解析对象
+        return arrival, self._parse(PushFrame, message)
+    
+    def _processResponse(self, response, arrival):
+        self._trackResume(response)
+        self._handleMessages(response.messages_list, arrival, response.now)
+    
+    def _sendAck(self, ws, log_id, internal_ext):
+        """
+        回复ack帧
+        :param log_id: 收到的PushFrame.log_id
+        :param internal_ext: Response.internal_ext的原始bytes
+        """
+        if self.metrics is None:
+            ws.send(encodeAck(log_id, internal_ext), OPCODE_BINARY)
+            return
+        start = time.perf_counter()
+        ws.send(encodeAck(log_id, internal_ext), OPCODE_BINARY)
+        self.metrics.ack_seconds.observe(time.perf_counter() - start)
+    
+    def _onPipelineDecoded(self, response, arrival, seconds):
+        if self.metrics is not None:
+            self.metrics.response_seconds.observe(seconds)
+            if response.skipped:
+                self.metrics.skipped.inc(response.skipped)
+            # 工作线程/进程中使用的是不带耗时统计的解析函数
+            response.bindParser(self._parse)
+        self._processResponse(response, arrival)
+    
+    def _decompress(self, payload):
+        """
+        :param payload: PushFrame中gzip压缩的payload
+        :return: Response的protobuf编码
+        """
+        if self.metrics is None:
+            return gzip.decompress(payload)
+        start = time.perf_counter()
+        data = gzip.decompress(payload)
+        self.metrics.gzip_seconds.observe(time.perf_counter() - start)
+        return data
+    
+    def _scanResponse(self, data):
+        """
+        扫描Response，未订阅的消息在此处丢弃，消息体保持原始bytes
+        :param data: 解压后的Response
+        :return: frameDecoder.RawResponse
+        """
+        if self.metrics is None:
+            return scanResponse(data, self._method_filter, self._parse)
+        start = time.perf_counter()
+        response = scanResponse(data, self._method_filter, self._parse)
+        self.metrics.response_seconds.observe(time.perf_counter() - start)
+        if response.skipped:
+            self.metrics.skipped.inc(response.skipped)
+        return response
+    
+    def _handleMessages(self, messages_list, arrival, server_now):
+        """
+        开启ingest时消息入队由处理线程分发，否则直接分发
+        """
+        if self.ingest is None:
+            self._dispatchMessages(messages_list, arrival, server_now)
+            return
+        put = self.ingest.put
+        for msg in messages_list:
+            put(msg, arrival, server_now)
+    
+    def _consumeIngest(self, msg, arrival, server_now):
+        self._dispatchMessages((msg,), arrival, server_now)
+    
+    def _dispatchMessages(self, messages_list, arrival=0.0, server_now=0):
+        """
+        根据消息类别解析消息体
+        :param messages_list: Response中的消息列表
+        :param arrival: 收到该帧的本地时间（秒）
+        :param server_now: Response.now，毫秒
+        """
+        self._frame_arrival = arrival or time.time()
+        self._server_now = server_now
+        handlers = self._handlers
+        metrics = self.metrics
+        dedup = self.dedup
+        for msg in messages_list:
+            handler = handlers.get(msg.method)
+            if handler is None:
+                continue
+            if dedup is not None and msg.msg_id and dedup.isDuplicate(msg.msg_id):
+                if metrics is not None:
+                    metrics.duplicates.inc()
+                continue
+            if metrics is not None:
+                metrics.message(msg.method).inc()
             try:
-                {
-                    'WebcastChatMessage': self._parseChatMsg,  # 聊天消息
-                    'WebcastGiftMessage': self._parseGiftMsg,  # 礼物消息
-                    'WebcastLikeMessage': self._parseLikeMsg,  # 点赞消息
-                    'WebcastMemberMessage': self._parseMemberMsg,  # 进入直播间消息
-                    'WebcastSocialMessage': self._parseSocialMsg,  # 关注消息
-                    'WebcastRoomUserSeqMessage': self._parseRoomUserSeqMsg,  # 直播间统计
-                    'WebcastFansclubMessage': self._parseFansclubMsg,  # 粉丝团消息
-                    'WebcastControlMessage': self._parseControlMsg,  # 直播间状态消息
-                    'WebcastEmojiChatMessage': self._parseEmojiChatMsg,  # 聊天表情包消息
-                    'WebcastRoomStatsMessage': self._parseRoomStatsMsg,  # 直播间统计信息
-                    'WebcastRoomMessage': self._parseRoomMsg,  # 直播间信息
-                    'WebcastRoomRankMessage': self._parseRankMsg,  # 直播间排行榜信息
-                }.get(method)(msg.payload)
+                # 消息体在处理函数访问msg.parsed时才解析
+                handler(msg)
             except Exception:
-                pass
+                if metrics is not None:
+                    metrics.handlerError(msg.method).inc()
     
     def _wsOnError(self, ws, error):
         print("WebSocket error: ", error)
@@ -245,86 +496,109 @@ class DouyinLiveWebFetcher:
     def _wsOnClose(self, ws, *args):
         print("WebSocket connection closed.")
     
-    def _parseChatMsg(self, payload):
+    def _emit(self, event):
+        """
+        把事件交给所有sink
+        """
+        for sink in self.sinks:
+            # 单个sink出错不影响其他sink与接收线程
+            try:
+                sink.emit(event)
+            except Exception as err:
+                print("【X】Sink emit error: ", err)
+        if self.latency is not None:
+            self.latency.observe(self.live_id, event.method, event.create_time, self._server_now,
+                                 self._frame_arrival)
+    
+    def _userEvent(self, event_type, method, message, **kwargs):
+        common = message.common
+        user = message.user
+        if self.user_table is not None:
+            user = self.user_table.intern(user)
+        return event_type(live_id=self.live_id, method=method, msg_id=common.msg_id, create_time=common.create_time,
+                          user_id=user.id, user_name=user.nick_name, user=user, **kwargs)
+    
+    def _parseChatMsg(self, msg):
         """聊天消息"""
-        message = ChatMessage().parse(payload)
-        user_name = message.user.nick_name
-        user_id = message.user.id
-        content = message.content
-        print(f"【聊天msg】[{user_id}]{user_name}: {content}")
+        message = msg.parsed
+        self._emit(self._userEvent(ChatEvent, 'WebcastChatMessage', message, content=message.content))
     
-    def _parseGiftMsg(self, payload):
+    def _parseGiftMsg(self, msg):
         """礼物消息"""
-        message = GiftMessage().parse(payload)
-        user_name = message.user.nick_name
-        gift_name = message.gift.name
-        gift_cnt = message.combo_count
-        print(f"【礼物msg】{user_name} 送出了 {gift_name}x{gift_cnt}")
+        message = msg.parsed
+        gift = message.gift
+        self._emit(self._userEvent(GiftEvent, 'WebcastGiftMessage', message,
+                                   gift_id=message.gift_id or gift.id, gift_name=gift.name,
+                                   diamond_count=gift.diamond_count, combo_count=message.combo_count,
+                                   repeat_count=message.repeat_count, group_count=message.group_count,
+                                   group_id=message.group_id, repeat_end=message.repeat_end, combo=gift.combo))
     
-    def _parseLikeMsg(self, payload):
+    def _parseLikeMsg(self, msg):
         '''点赞消息'''
-        message = LikeMessage().parse(payload)
-        user_name = message.user.nick_name
-        count = message.count
-        print(f"【点赞msg】{user_name} 点了{count}个赞")
+        message = msg.parsed
+        self._emit(self._userEvent(LikeEvent, 'WebcastLikeMessage', message,
+                                   count=message.count, total=message.total))
     
-    def _parseMemberMsg(self, payload):
+    def _parseMemberMsg(self, msg):
         '''进入直播间消息'''
-        message = MemberMessage().parse(payload)
-        user_name = message.user.nick_name
-        user_id = message.user.id
-        gender = ["女", "男"][message.user.gender]
-        print(f"【进场msg】[{user_id}][{gender}]{user_name} 进入了直播间")
+        message = msg.parsed
+        self._emit(self._userEvent(MemberEvent, 'WebcastMemberMessage', message, gender=message.user.gender))
     
-    def _parseSocialMsg(self, payload):
+    def _parseSocialMsg(self, msg):
         '''关注消息'''
-        message = SocialMessage().parse(payload)
-        user_name = message.user.nick_name
-        user_id = message.user.id
-        print(f"【关注msg】[{user_id}]{user_name} 关注了主播")
+        message = msg.parsed
+        self._emit(self._userEvent(SocialEvent, 'WebcastSocialMessage', message))
     
-    def _parseRoomUserSeqMsg(self, payload):
+    def _parseRoomUserSeqMsg(self, msg):
         '''直播间统计'''
-        message = RoomUserSeqMessage().parse(payload)
-        current = message.total
-        total = message.total_pv_for_anchor
-        print(f"【统计msg】当前观看人数: {current}, 累计观看人数: {total}")
+        message = msg.parsed
+        common = message.common
+        self._emit(RoomUserSeqEvent(live_id=self.live_id, method='WebcastRoomUserSeqMessage',
+                                    msg_id=common.msg_id, create_time=common.create_time,
+                                    current=message.total, total=message.total_pv_for_anchor))
     
-    def _parseFansclubMsg(self, payload):
+    def _parseFansclubMsg(self, msg):
         '''粉丝团消息'''
-        message = FansclubMessage().parse(payload)
-        content = message.content
-        print(f"【粉丝团msg】 {content}")
+        message = msg.parsed
+        common = message.common_info
+        self._emit(FansclubEvent(live_id=self.live_id, method='WebcastFansclubMessage',
+                                 msg_id=common.msg_id, create_time=common.create_time, content=message.content))
     
-    def _parseEmojiChatMsg(self, payload):
+    def _parseEmojiChatMsg(self, msg):
         '''聊天表情包消息'''
-        message = EmojiChatMessage().parse(payload)
-        emoji_id = message.emoji_id
-        user = message.user
-        common = message.common
-        default_content = message.default_content
-        print(f"【聊天表情包id】 {emoji_id},user：{user},common:{common},default_content:{default_content}")
+        message = msg.parsed
+        self._emit(self._userEvent(EmojiChatEvent, 'WebcastEmojiChatMessage', message,
+                                   emoji_id=message.emoji_id, default_content=message.default_content,
+                                   common=message.common))
     
-    def _parseRoomMsg(self, payload):
-        message = RoomMessage().parse(payload)
+    def _parseRoomMsg(self, msg):
+        message = msg.parsed
         common = message.common
-        room_id = common.room_id
-        print(f"【直播间msg】直播间id:{room_id}")
+        self._emit(RoomEvent(live_id=self.live_id, method='WebcastRoomMessage',
+                             msg_id=common.msg_id, create_time=common.create_time, room_id=common.room_id))
     
-    def _parseRoomStatsMsg(self, payload):
-        message = RoomStatsMessage().parse(payload)
-        display_long = message.display_long
-        print(f"【直播间统计msg】{display_long}")
+    def _parseRoomStatsMsg(self, msg):
+        message = msg.parsed
+        common = message.common
+        self._emit(RoomStatsEvent(live_id=self.live_id, method='WebcastRoomStatsMessage',
+                                  msg_id=common.msg_id, create_time=common.create_time,
+                                  display_long=message.display_long))
     
-    def _parseRankMsg(self, payload):
-        message = RoomRankMessage().parse(payload)
-        ranks_list = message.ranks_list
-        print(f"【直播间排行榜msg】{ranks_list}")
+    def _parseRankMsg(self, msg):
+        message = msg.parsed
+        common = message.common
+        self._emit(RankEvent(live_id=self.live_id, method='WebcastRoomRankMessage',
+                             msg_id=common.msg_id, create_time=common.create_time, ranks_list=message.ranks_list))
     
-    def _parseControlMsg(self, payload):
+    def _parseControlMsg(self, msg):
         '''直播间状态消息'''
-        message = ControlMessage().parse(payload)
+        message = msg.parsed
+        common = message.common
+        self._emit(ControlEvent(live_id=self.live_id, method='WebcastControlMessage',
+                                msg_id=common.msg_id, create_time=common.create_time, status=message.status))
         
         if message.status == 3:
-            print("直播间已结束")
+            # 下次开播会分配新的room_id
+            if self.cache is not None:
+                self.cache.invalidateRoomId(self.live_id)
             self.stop()
@@ -0,0 +1,312 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    metrics.py
+# @Time:        2025/2/8 15:02
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+热点路径指标，兼容Prometheus文本格式：
+    fetcher_metrics = FetcherMetrics()
+    startMetricsServer(port=9100)
+    DouyinLiveWebFetcher(live_id, metrics=fetcher_metrics).start()
+然后访问 http://127.0.0.1:9100/metrics，或在代码中调用 REGISTRY.snapshot()
+"""
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认的耗时分桶（秒）
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatLabels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 最后一个为+Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        获取指定标签值的子指标，热点路径中应缓存返回值，避免每次查找
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._newChild()
+        return child
+
+    def _newChild(self):
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _newChild(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        return [f"{self.name}{_formatLabels(self.labelnames, values)} {child.value}"
+                for values, child in self._items()]
+
+    def snapshot(self):
+        return {values: child.value for values, child in self._items()}
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _newChild(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = []
+        for values, child in self._items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_formatLabels(self.labelnames, values, le_label)} {cumulative}")
+            labels = _formatLabels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {child.sum}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+    def snapshot(self):
+        return {values: {"count": child.count, "sum": child.sum,
+                         "buckets": dict(zip(self.buckets + (float('inf'),), child.counts))}
+                for values, child in self._items()}
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """
+        Prometheus文本格式
+        """
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        :return: {指标名: {标签值元组: 值}}
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = Registry()
+
+
+class FetcherMetrics:
+
+    def __init__(self, registry=None):
+        """
+        抓取流程用到的全部指标，多个抓取对象可共用一个实例，以live_id区分
+        :param registry: 默认注册到REGISTRY
+        """
+        registry = registry or REGISTRY
+        self.registry = registry
+        self.frames = registry.counter("douyin_frames_total", "Websocket frames received", ("live_id",))
+        self.bytes = registry.counter("douyin_frame_bytes_total", "Websocket frame bytes received", ("live_id",))
+        self.messages = registry.counter("douyin_messages_total", "Messages dispatched by method",
+                                         ("live_id", "method"))
+        self.skipped = registry.counter("douyin_messages_skipped_total",
+                                        "Messages dropped before decoding (unsubscribed)", ("live_id",))
+        self.decode_seconds = registry.histogram("douyin_decode_seconds", "Decode time by stage", ("stage",))
+        self.handler_errors = registry.counter("douyin_handler_errors_total", "Handler exceptions by method",
+                                               ("live_id", "method"))
+        self.ack_seconds = registry.histogram("douyin_ack_send_seconds", "Time spent sending acks")
+        self.signature_seconds = registry.histogram("douyin_signature_seconds", "Time spent generating signatures")
+        self.reconnects = registry.counter("douyin_reconnects_total", "Websocket reconnects", ("live_id",))
+        self.duplicates = registry.counter("douyin_messages_duplicate_total",
+                                           "Duplicate messages dropped by msg_id", ("live_id",))
+
+    def forRoom(self, live_id):
+        """
+        绑定到某个直播间的指标
+        """
+        return RoomMetrics(self, live_id)
+
+
+class RoomMetrics:
+    """
+    预先取好某个直播间各标签的子指标，热点路径上只剩一次加锁自增
+    """
+
+    def __init__(self, fetcher_metrics, live_id):
+        self.fetcher_metrics = fetcher_metrics
+        self.live_id = live_id
+        self.frames = fetcher_metrics.frames.labels(live_id)
+        self.bytes = fetcher_metrics.bytes.labels(live_id)
+        self.skipped = fetcher_metrics.skipped.labels(live_id)
+        self.gzip_seconds = fetcher_metrics.decode_seconds.labels('gzip')
+        self.response_seconds = fetcher_metrics.decode_seconds.labels('response')
+        self.frame_seconds = fetcher_metrics.decode_seconds.labels('frame')
+        self.payload_seconds = fetcher_metrics.decode_seconds.labels('payload')
+        self.ack_seconds = fetcher_metrics.ack_seconds.labels()
+        self.signature_seconds = fetcher_metrics.signature_seconds.labels()
+        self.reconnects = fetcher_metrics.reconnects.labels(live_id)
+        self.duplicates = fetcher_metrics.duplicates.labels(live_id)
+        self._messages = {}
+        self._handler_errors = {}
+
+    def message(self, method):
+        child = self._messages.get(method)
+        if child is None:
+            child = self._messages[method] = self.fetcher_metrics.messages.labels(self.live_id, method)
+        return child
+
+    def handlerError(self, method):
+        child = self._handler_errors.get(method)
+        if child is None:
+            child = self._handler_errors[method] = self.fetcher_metrics.handler_errors.labels(self.live_id, method)
+        return child
+
+    def timedParser(self, parse):
+        """
+        包装解析函数，PushFrame记入frame阶段，其余结构体记入payload阶段
+        """
+        frame_seconds = self.frame_seconds
+        payload_seconds = self.payload_seconds
+        perf_counter = time.perf_counter
+
+        def timedParse(message_type, data):
+            start = perf_counter()
+            message = parse(message_type, data)
+            elapsed = perf_counter() - start
+            if message_type.__name__ == 'PushFrame':
+                frame_seconds.observe(elapsed)
+            else:
+                payload_seconds.observe(elapsed)
+            return message
+
+        return timedParse
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startMetricsServer(port=9100, host='127.0.0.1', registry=None):
+    """
+    在后台线程中启动/metrics服务
+    :return: server，调用shutdown()停止
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = registry or REGISTRY
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    pipeline.py
+# @Time:        2025/1/22 14:30
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from frameDecoder import getParser, scanResponse
+
+
+def decodeResponse(data, methods=None, backend='betterproto'):
+    """
+    扫描解压后的Response，在线程池/进程池中执行
+    :return: (frameDecoder.RawResponse, 扫描耗时（秒）)
+    """
+    start = time.perf_counter()
+    response = scanResponse(data, methods, getParser(backend))
+    return response, time.perf_counter() - start
+
+
+class DecodePipeline:
+
+    def __init__(self, deliver, workers=4, executor='thread', max_pending=1024):
+        """
+        解析流水线：接收线程解压并回复ack后只负责提交，Response的扫描与消息过滤在线程池/进程池中并行执行，
+        解析完成的Response再按提交顺序（即帧到达顺序，同一连接上与seq_id顺序一致）交给deliver处理
+        :param deliver: deliver(response, context, seconds)，在单独的分发线程中按顺序调用，seconds为扫描耗时
+        :param workers: 线程/进程数
+        :param executor: 'thread' 或 'process'，解析成为瓶颈时使用进程池
+        :param max_pending: 最多积压的帧数，超过后submit阻塞，避免内存无限增长
+        """
+        if executor == 'thread':
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix='decode')
+        elif executor == 'process':
+            self._executor = ProcessPoolExecutor(workers)
+        else:
+            raise ValueError(f"unknown executor {executor!r}, choose from 'thread', 'process'")
+        self.deliver = deliver
+        self._ordered = queue.Queue(max_pending)
+        self._closed = False
+        self._deliver_thread = threading.Thread(target=self._deliverLoop, name='decode-deliver', daemon=True)
+        self._deliver_thread.start()
+
+    def submit(self, data, context=None, methods=None, backend='betterproto'):
+        """
+        提交一帧解压后的Response
+        :param context: 原样传给deliver，如收到帧的本地时间
+        """
+        if self._closed:
+            return
+        future = self._executor.submit(decodeResponse, data, methods, backend)
+        self._ordered.put((future, context))
+
+    def pending(self):
+        return self._ordered.qsize()
+
+    def close(self, wait=True):
+        """
+        停止流水线，wait为True时等待已提交的帧分发完毕
+        """
+        if self._closed:
+            return
+        self._closed = True
+        # 可能在分发线程中调用（如直播结束时stop()），队列已满时不能阻塞等待自己，由_deliverLoop超时后检查_closed退出
+        try:
+            self._ordered.put_nowait(None)
+        except queue.Full:
+            pass
+        if wait and threading.current_thread() is not self._deliver_thread:
+            self._deliver_thread.join()
+        self._executor.shutdown(wait=False)
+
+    def _deliverLoop(self):
+        while True:
+            try:
+                item = self._ordered.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            if item is None:
+                return
+            future, context = item
+            try:
+                response, seconds = future.result()
+            except Exception as err:
+                print("【X】Decode frame error: ", err)
+                continue
+            try:
+                self.deliver(response, context, seconds)
+            except Exception as err:
+                print("【X】Deliver frame error: ", err)
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    recorder.py
+# @Time:        2025/2/3 21:17
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+原始帧录制与回放，回放不需要网络，可用于复现线上负载、回归与解析问题：
+    python recorder.py record 243749493750 room.frames
+    python recorder.py replay room.frames --speed 10
+    python recorder.py replay room.frames --speed 0 --decoder fast --quiet
+"""
+
+import argparse
+import mmap
+import struct
+import threading
+import time
+
+FILE_MAGIC = b'DYFRAME1'
+# 每条记录：接收时间戳(float64, 秒) + 帧长度(uint32) + 帧数据
+_RECORD_HEADER = struct.Struct('<dI')
+
+
+class FrameRecorder:
+
+    def __init__(self, path, buffering=1 << 20):
+        """
+        按接收顺序追加写入websocket原始二进制帧
+        :param path: 录制文件路径，已存在时在末尾追加
+        :param buffering: 写缓冲大小
+        """
+        self.path = path
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab', buffering=buffering)
+        if self._file.tell() == 0:
+            self._file.write(FILE_MAGIC)
+
+    def write(self, frame, timestamp=None):
+        header = _RECORD_HEADER.pack(time.time() if timestamp is None else timestamp, len(frame))
+        with self._lock:
+            self._file.write(header)
+            self._file.write(frame)
+            self.frames += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class FrameReader:
+
+    def __init__(self, path):
+        """
+        以内存映射方式读取录制文件
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a frame recording")
+
+    def __iter__(self):
+        """
+        :return: 生成 (接收时间戳, 帧数据)
+        """
+        data = self._mmap
+        pos = len(FILE_MAGIC)
+        end = len(data)
+        header_size = _RECORD_HEADER.size
+        while pos + header_size <= end:
+            timestamp, length = _RECORD_HEADER.unpack_from(data, pos)
+            pos += header_size
+            if pos + length > end:
+                # 录制进程被中断时最后一条记录可能不完整
+                break
+            yield timestamp, data[pos:pos + length]
+            pos += length
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplaySocket:
+    """
+    回放时代替websocket，ack只计数不发送
+    """
+
+    def __init__(self):
+        self.acks = 0
+
+    def send(self, data, opcode=None):
+        self.acks += 1
+
+    def close(self):
+        pass
+
+
+def replay(fetcher, path, speed=1.0):
+    """
+    把录制的帧按原有的解析、分发流程重新处理一遍
+    :param fetcher: DouyinLiveWebFetcher实例
+    :param path: 录制文件路径
+    :param speed: 回放倍速，1为原速，10为10倍速，0或None为不等待、尽快处理
+    :return: 回放统计
+    """
+    ws = ReplaySocket()
+    fetcher.ws = ws
+    frames = 0
+    size = 0
+    start = time.perf_counter()
+    with FrameReader(path) as reader:
+        first_ts = None
+        for timestamp, frame in reader:
+            if speed:
+                if first_ts is None:
+                    first_ts = timestamp
+                delay = (timestamp - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            fetcher._wsOnMessage(ws, frame)
+            frames += 1
+            size += len(frame)
+    if fetcher._pipeline is not None:
+        fetcher._pipeline.close()
+    if fetcher.ingest is not None:
+        fetcher.ingest.close()
+    for sink in fetcher.sinks:
+        sink.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": frames,
+        "bytes": size,
+        "acks": ws.acks,
+        "elapsed": elapsed,
+        "frames_per_sec": frames / elapsed if elapsed else 0.0,
+    }
+
+
+if __name__ == '__main__':
+    from liveMan import DouyinLiveWebFetcher
+
+    parser = argparse.ArgumentParser(description="record or replay raw websocket frames")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("live_id")
+    record_parser.add_argument("path")
+    replay_parser = subparsers.add_parser("replay")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0表示尽快回放")
+    replay_parser.add_argument("--decoder", default="betterproto")
+    replay_parser.add_argument("--quiet", action="store_true", help="不输出事件，只统计耗时")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        frame_recorder = FrameRecorder(args.path)
+        try:
+            DouyinLiveWebFetcher(args.live_id, recorder=frame_recorder).start()
+        finally:
+            frame_recorder.close()
+    else:
+        replay_fetcher = DouyinLiveWebFetcher("replay", decoder=args.decoder, sinks=[] if args.quiet else None)
+        print(replay(replay_fetcher, args.path, args.speed))
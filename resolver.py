@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    resolver.py
+# @Time:        2025/2/25 20:18
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+ttwid与room_id解析：共用带连接池的requests.Session，保持长连接，
+批量解析多个直播间时并发请求，限制并发数并失败重试：
+    resolver = RoomResolver(concurrency=16, cache=RoomCache('douyin_cache.sqlite'))
+    room_ids = resolver.resolveRooms(['261378947940', '243749493750'])
+"""
+
+import random
+import re
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LIVE_URL = "https://live.douyin.com/"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) " \
+             "Chrome/120.0.0.0 Safari/537.36"
+
+_ROOM_ID_PATTERN = re.compile(r'roomId\\":\\"(\d+)\\"')
+
+
+def generateMsToken(length=107):
+    """
+    产生请求头部cookie中的msToken字段，其实为随机的107位字符
+    :param length:字符位数
+    :return:msToken
+    """
+    random_str = ''
+    base_str = string.ascii_letters + string.digits + '=_'
+    _len = len(base_str) - 1
+    for _ in range(length):
+        random_str += base_str[random.randint(0, _len)]
+    return random_str
+
+
+class RoomResolver:
+
+    def __init__(self, concurrency=8, retries=2, backoff=0.5, timeout=10, cache=None, live_url=LIVE_URL,
+                 user_agent=USER_AGENT):
+        """
+        :param concurrency: resolveRooms的最大并发请求数，同时也是连接池大小
+        :param retries: 请求失败或页面中没有roomId时的重试次数
+        :param backoff: 重试等待的初始上限（秒），每次翻倍并随机抖动
+        :param timeout: 单次请求超时（秒）
+        :param cache: roomCache.RoomCache，有效期内直接使用缓存
+        :param live_url: 直播页地址，测试时可指向本地服务
+        """
+        # requests连带urllib3、certifi等导入较慢，创建解析器时才导入
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.live_url = live_url
+        self.user_agent = user_agent
+        self.requests = 0
+        self.failures = 0
+        self.session = requests.Session()
+        # 连接池大小与并发数一致，所有请求复用到live.douyin.com的keep-alive连接
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers["User-Agent"] = user_agent
+        self._ttwid = None
+        self._lock = threading.Lock()
+
+    def _get(self, url, **kwargs):
+        """
+        带重试的GET请求
+        :param kwargs: check(response)返回None时视为失败并重试，其余参数传给session.get
+        :return: check的返回值，全部失败时返回None
+        """
+        check = kwargs.pop('check')
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            self.requests += 1
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+                response.raise_for_status()
+            except Exception as err:
+                error = err
+                continue
+            value = check(response)
+            if value is not None:
+                return value
+            error = None
+        self.failures += 1
+        if error is not None:
+            print(f"【X】Request {url} error: ", error)
+        return None
+
+    def fetchTtwid(self):
+        """
+        访问直播首页，从响应cookie中获取ttwid
+        """
+        return self._get(self.live_url, check=lambda response: response.cookies.get('ttwid'))
+
+    def ttwid(self):
+        """
+        :return: 本解析器共用的ttwid
+        """
+        if self._ttwid:
+            return self._ttwid
+        with self._lock:
+            if not self._ttwid:
+                if self.cache is not None:
+                    self._ttwid = self.cache.getTtwid(self.fetchTtwid)
+                else:
+                    self._ttwid = self.fetchTtwid()
+        return self._ttwid
+
+    def fetchRoomId(self, live_id, ttwid=None):
+        """
+        请求直播间页面解析出room_id
+        :param ttwid: 请求使用的ttwid，默认为ttwid()
+        """
+        ttwid = ttwid or self.ttwid()
+        headers = {
+            "cookie": f"ttwid={ttwid}&msToken={generateMsToken()}; __ac_nonce=0123407cc00a9e438deb4",
+        }
+
+        def check(response):
+            match = _ROOM_ID_PATTERN.search(response.text)
+            if match is None:
+                print(f"【X】No match found for roomId of {live_id}")
+                return None
+            return match.group(1)
+
+        return self._get(self.live_url + live_id, headers=headers, check=check)
+
+    def resolveRoom(self, live_id):
+        if self.cache is not None:
+            return self.cache.getRoomId(live_id, lambda: self.fetchRoomId(live_id))
+        return self.fetchRoomId(live_id)
+
+    def resolveRooms(self, live_ids):
+        """
+        并发解析多个直播间的room_id
+        :return: {live_id: room_id}，解析失败的为None
+        """
+        live_ids = list(dict.fromkeys(live_ids))
+        if not live_ids:
+            return {}
+        # 先取好ttwid，避免各线程同时请求首页
+        self.ttwid()
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(live_ids)),
+                                thread_name_prefix='room-resolver') as executor:
+            return dict(zip(live_ids, executor.map(self.resolveRoom, live_ids)))
+
+    def close(self):
+        self.session.close()
+
+    def stats(self):
+        return {"requests": self.requests, "failures": self.failures}
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def getResolver():
+    """
+    获取进程内共用的解析器
+    """
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = RoomResolver()
+    return _resolver
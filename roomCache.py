@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    roomCache.py
+# @Time:        2025/2/23 14:37
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+ttwid与live_id -> room_id的本地磁盘缓存（SQLite），多个进程可共用同一个文件，
+批量重启大量直播间时不必逐个请求直播间页面：
+    cache = RoomCache('douyin_cache.sqlite')
+    DouyinLiveWebFetcher(live_id, cache=cache).start()
+条目过期前的最后一段时间（refresh_ahead）内读取时，先返回缓存值，再在后台刷新
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class RoomCache:
+
+    def __init__(self, path='douyin_cache.sqlite', ttwid_ttl=86400, room_ttl=6 * 3600, refresh_ahead=0.8,
+                 refresh_timeout=60):
+        """
+        :param path: SQLite文件路径
+        :param ttwid_ttl: ttwid有效期（秒）
+        :param room_ttl: room_id有效期（秒），主播重新开播后room_id会变化
+        :param refresh_ahead: 条目存活超过有效期的该比例后，读取时在后台提前刷新
+        :param refresh_timeout: 某个进程认领刷新后，其他进程等待多少秒才会再次尝试
+        """
+        self.path = path
+        self.ttwid_ttl = ttwid_ttl
+        self.room_ttl = room_ttl
+        self.refresh_ahead = refresh_ahead
+        self.refresh_timeout = refresh_timeout
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache ("
+                         "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL, "
+                         "expires REAL NOT NULL, refreshing REAL NOT NULL DEFAULT 0)")
+
+    def _connect(self):
+        # sqlite3连接不能跨线程使用，每个线程各自打开
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """
+        :return: (value, updated, expires)，没有该条目时返回None
+        """
+        return self._connect().execute("SELECT value, updated, expires FROM cache WHERE key=?", (key,)).fetchone()
+
+    def put(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, updated, expires, refreshing) "
+                         "VALUES (?, ?, ?, ?, 0)", (key, value, now, now + ttl))
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE key=?", (key,))
+
+    def getOrFetch(self, key, fetch, ttl):
+        """
+        读取缓存，缺失或过期时调用fetch()获取并写入
+        :param fetch: 获取函数，失败时返回None
+        :return: 值，获取失败时返回过期的旧值（如果有）
+        """
+        now = time.time()
+        row = self.get(key)
+        if row is not None:
+            value, updated, expires = row
+            if now < expires:
+                self.hits += 1
+                if now - updated >= (expires - updated) * self.refresh_ahead and self._claimRefresh(key, now):
+                    threading.Thread(target=self._refresh, args=(key, fetch, ttl), name='room-cache-refresh',
+                                     daemon=True).start()
+                return value
+        self.misses += 1
+        value = fetch()
+        if value:
+            self.put(key, value, ttl)
+            return value
+        # 请求失败时宁可用过期的值
+        return row[0] if row is not None else value
+
+    def _claimRefresh(self, key, now):
+        """
+        多个进程同时读到即将过期的条目时，只有一个进程负责刷新
+        """
+        with self._connect() as conn:
+            cursor = conn.execute("UPDATE cache SET refreshing=? WHERE key=? AND refreshing<?",
+                                  (now + self.refresh_timeout, key, now))
+            return cursor.rowcount == 1
+
+    def _refresh(self, key, fetch, ttl):
+        try:
+            value = fetch()
+        except Exception as err:
+            print("【X】Cache refresh error: ", err)
+            return
+        if value:
+            self.put(key, value, ttl)
+            self.refreshes += 1
+
+    def getTtwid(self, fetch):
+        return self.getOrFetch('ttwid', fetch, self.ttwid_ttl)
+
+    def getRoomId(self, live_id, fetch):
+        return self.getOrFetch(f'room_id:{live_id}', fetch, self.room_ttl)
+
+    def invalidateRoomId(self, live_id):
+        """
+        room_id失效（如主播重新开播）时删除
+        """
+        self.delete(f'room_id:{live_id}')
+
+    def purge(self):
+        """
+        删除所有过期条目
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE expires<?", (time.time(),))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "refreshes": self.refreshes,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
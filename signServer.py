@@ -0,0 +1,281 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    signServer.py
+# @Time:        2025/1/12 15:37
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+本地签名服务：多个抓取进程共用一组常驻的sign.js上下文，内存占用不再随直播间数量线性增长
+
+启动服务：
+    python signServer.py --port 8765 --pool 4
+    python signServer.py --unix /tmp/douyin_sign.sock --pool 4
+
+抓取端使用：
+    client = SignClient("http://127.0.0.1:8765")
+    DouyinLiveWebFetcher(live_id, sign_func=client.generateSignature).start()
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from signer import Signer, generateSignMd5, getSignatureCache
+
+
+class SignerPool:
+
+    def __init__(self, size=2, script_file='sign.js'):
+        """
+        预热好的Signer池，请求在池上排队，每个Signer同一时刻只服务一个请求
+        :param size: 上下文个数
+        :param script_file: 签名js脚本路径
+        """
+        self.size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(Signer(script_file))
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.requests = 0
+        self.signatures = 0
+        self.errors = 0
+
+    def getSigns(self, md5_list):
+        """
+        批量签名，同一批次占用同一个Signer，避免逐个排队
+        :param md5_list: md5列表
+        :return: (signature列表, 耗时毫秒)
+        """
+        start = time.perf_counter()
+        signer = self._idle.get()
+        try:
+            signatures = [signer.getSign(md5) for md5 in md5_list]
+        except Exception:
+            with self._stats_lock:
+                self.errors += 1
+            raise
+        finally:
+            self._idle.put(signer)
+        latency_ms = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self.requests += 1
+            self.signatures += len(signatures)
+            self._latencies.append(latency_ms)
+        return signatures, latency_ms
+
+    def getSign(self, md5_param):
+        signatures, latency_ms = self.getSigns([md5_param])
+        return signatures[0], latency_ms
+
+    def stats(self):
+        """
+        服务统计，延迟分位数基于最近1000次请求
+        """
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "pool_size": self.size,
+                "idle": self._idle.qsize(),
+                "requests": self.requests,
+                "signatures": self.signatures,
+                "errors": self.errors,
+            }
+        if latencies:
+            stats.update({
+                "latency_ms_p50": latencies[len(latencies) // 2],
+                "latency_ms_p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+                "latency_ms_max": latencies[-1],
+            })
+        return stats
+
+
+class SignRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /sign?md5=xxx              -> {"signature": "...", "latency_ms": 1.2}
+    POST /sign {"md5_list": [...]}  -> {"signatures": [...], "latency_ms": 3.4}
+    GET  /stats                     -> 服务统计
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == "/stats":
+            return self._reply(200, self.server.pool.stats())
+        if url.path != "/sign":
+            return self._reply(404, {"error": "not found"})
+        md5_param = urllib.parse.parse_qs(url.query).get("md5", [""])[0]
+        if not md5_param:
+            return self._reply(400, {"error": "missing md5"})
+        try:
+            signature, latency_ms = self.server.pool.getSign(md5_param)
+        except Exception as err:
+            return self._reply(500, {"error": str(err)})
+        self._reply(200, {"signature": signature, "latency_ms": latency_ms})
+
+    def do_POST(self):
+        if urllib.parse.urlparse(self.path).path != "/sign":
+            return self._reply(404, {"error": "not found"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            md5_list = list(body["md5_list"])
+        except Exception:
+            return self._reply(400, {"error": "body must be {\"md5_list\": [...]}"})
+        try:
+            signatures, latency_ms = self.server.pool.getSigns(md5_list)
+        except Exception as err:
+            return self._reply(500, {"error": str(err)})
+        self._reply(200, {"signatures": signatures, "latency_ms": latency_ms})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix socket的client_address为空
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def createSignServer(pool, host='127.0.0.1', port=8765, unix_path=None):
+    """
+    创建签名服务，指定unix_path时监听unix socket，否则监听本地http端口
+    :param pool: SignerPool
+    :return: server，调用serve_forever()开始服务
+    """
+    if unix_path:
+        server = UnixHTTPServer(unix_path, SignRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), SignRequestHandler)
+        server.daemon_threads = True
+    server.pool = pool
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class SignClient:
+
+    def __init__(self, address='http://127.0.0.1:8765', timeout=5, cache=None):
+        """
+        签名服务客户端，generateSignature可直接替代liveMan.generateSignature
+        :param address: http://host:port 或 unix:///path/to/sock
+        :param timeout: 请求超时秒数
+        :param cache: signer.SignatureCache，默认使用进程内的签名缓存
+        """
+        self.address = address
+        self.timeout = timeout
+        self.cache = cache
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            url = urllib.parse.urlparse(self.address)
+            if url.scheme == "unix":
+                conn = _UnixHTTPConnection(url.path, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for retry in (True, False):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = json.loads(response.read())
+            except (http.client.HTTPException, ConnectionError, socket.timeout):
+                # 长连接被服务端关闭后重连一次
+                conn.close()
+                self._local.conn = None
+                if not retry:
+                    raise
+                continue
+            if response.status != 200:
+                raise RuntimeError(f"sign server error {response.status}: {data.get('error')}")
+            return data
+
+    def getSign(self, md5_param):
+        return self._request("GET", "/sign?" + urllib.parse.urlencode({"md5": md5_param}))["signature"]
+
+    def getSigns(self, md5_list):
+        body = json.dumps({"md5_list": list(md5_list)})
+        return self._request("POST", "/sign", body)["signatures"]
+
+    def stats(self):
+        return self._request("GET", "/stats")
+
+    def generateSignature(self, wss):
+        """
+        与liveMan.generateSignature相同的调用方式
+        """
+        md5_param = generateSignMd5(wss)
+        cache = self.cache or getSignatureCache()
+        signature = cache.get(md5_param)
+        if signature:
+            return signature
+        try:
+            signature = self.getSign(md5_param)
+            cache.put(md5_param, signature)
+            return signature
+        except Exception as e:
+            print(e)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="douyin signature server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="unix socket路径，指定后不再监听http端口")
+    parser.add_argument("--pool", type=int, default=2, help="常驻的sign.js上下文个数")
+    parser.add_argument("--script", default="sign.js")
+    args = parser.parse_args()
+
+    sign_server = createSignServer(SignerPool(args.pool, args.script), args.host, args.port, args.unix)
+    print(f"Sign server listening on {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        sign_server.serve_forever()
+    except KeyboardInterrupt:
+        sign_server.server_close()
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    signer.py
+# @Time:        2025/1/10 10:21
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+
+# 参与signature计算的wss链接参数，顺序不可调整
+SIGN_PARAMS = ("live_id,aid,version_code,webcast_sdk_version,"
+               "room_id,sub_room_id,sub_channel_id,did_rule,"
+               "user_unique_id,device_platform,device_type,ac,"
+               "identity").split(',')
+
+
+def generateSignMd5(wss):
+    """
+    根据wss链接中的固定参数计算md5，作为js脚本get_sign的入参
+    :param wss: 直播间websocket链接
+    :return: md5十六进制字符串
+    """
+    wss_params = urllib.parse.urlparse(wss).query.split('&')
+    wss_maps = {i.split('=')[0]: i.split("=")[-1] for i in wss_params}
+    tpl_params = [f"{i}={wss_maps.get(i, '')}" for i in SIGN_PARAMS]
+    param = ','.join(tpl_params)
+    md5 = hashlib.md5()
+    md5.update(param.encode())
+    return md5.hexdigest()
+
+
+class Signer:
+
+    def __init__(self, script_file='sign.js'):
+        """
+        常驻的signature生成对象，sign.js只读取、编译一次，之后每次签名都复用同一个已预热的V8上下文
+        :param script_file: 签名js脚本路径
+        """
+        # V8扩展较重，首次签名时才加载
+        from py_mini_racer import MiniRacer
+        
+        self.script_file = script_file
+        self._lock = threading.Lock()
+        with codecs.open(script_file, 'r', encoding='utf8') as f:
+            script = f.read()
+        self._ctx = MiniRacer()
+        self._ctx.eval(script)
+        # 先空跑一次，让V8把get_sign及其依赖的函数编译、优化好
+        self._ctx.call("get_sign", hashlib.md5(b'').hexdigest())
+
+    def getSign(self, md5_param):
+        """
+        计算signature，同一个V8上下文不能被多个线程同时进入，因此加锁串行调用
+        :param md5_param: generateSignMd5计算出的md5
+        :return: signature
+        """
+        with self._lock:
+            return self._ctx.call("get_sign", md5_param)
+
+    def close(self):
+        with self._lock:
+            self._ctx.close()
+
+
+_signers = {}
+_signers_lock = threading.Lock()
+
+
+def getSigner(script_file='sign.js'):
+    """
+    获取进程内共享的Signer，同一个脚本在一个进程中只会加载一次
+    :param script_file: 签名js脚本路径
+    :return: Signer
+    """
+    signer = _signers.get(script_file)
+    if signer is None:
+        with _signers_lock:
+            signer = _signers.get(script_file)
+            if signer is None:
+                signer = Signer(script_file)
+                _signers[script_file] = signer
+    return signer
+
+
+class SignatureCache:
+
+    def __init__(self, maxsize=1024, ttl=3600, path=None):
+        """
+        md5 -> signature 的LRU缓存，重连同一个直播间时md5不变，命中后无需再调用js签名
+        :param maxsize: 最多缓存的条目数
+        :param ttl: 条目有效期（秒），None表示不过期
+        :param path: 持久化文件路径，指定后启动时加载、每次写入后落盘
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # md5 -> (signature, 过期时间戳)
+        self._data = OrderedDict()
+        if path and os.path.exists(path):
+            self._load()
+
+    def get(self, md5_param):
+        with self._lock:
+            item = self._data.get(md5_param)
+            if item is not None and item[1] is not None and item[1] <= time.time():
+                del self._data[md5_param]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(md5_param)
+            self.hits += 1
+            return item[0]
+
+    def put(self, md5_param, signature):
+        expire_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[md5_param] = (signature, expire_at)
+            self._data.move_to_end(md5_param)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            if self.path:
+                self._save()
+
+    def delete(self, md5_param):
+        """
+        删除一个条目，如签名被服务端拒绝、需要重新签名时
+        """
+        with self._lock:
+            if self._data.pop(md5_param, None) is not None and self.path:
+                self._save()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            if self.path:
+                self._save()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf8') as f:
+                items = json.load(f)
+        except (OSError, ValueError) as err:
+            print("【X】Load signature cache error: ", err)
+            return
+        now = time.time()
+        for md5_param, (signature, expire_at) in items.items():
+            if expire_at is None or expire_at > now:
+                self._data[md5_param] = (signature, expire_at)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _save(self):
+        # 先写临时文件再替换，避免进程中断时留下半截文件
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                json.dump(self._data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            print("【X】Save signature cache error: ", err)
+
+
+_signature_cache = SignatureCache()
+
+
+def getSignatureCache():
+    """
+    获取进程内默认的签名缓存
+    """
+    return _signature_cache
+
+
+def configureSignatureCache(maxsize=1024, ttl=3600, path=None):
+    """
+    替换进程内默认的签名缓存，例如开启持久化：configureSignatureCache(path='sign_cache.json')
+    :return: 新的SignatureCache
+    """
+    global _signature_cache
+    _signature_cache = SignatureCache(maxsize, ttl, path)
+    return _signature_cache
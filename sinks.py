@@ -0,0 +1,164 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    sinks.py
+# @Time:        2025/1/24 11:42
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+import sys
+import threading
+
+
+class Sink:
+    """
+    事件输出接口，子类实现emitBatch即可
+    """
+
+    def emit(self, event):
+        self.emitBatch([event])
+
+    def emitBatch(self, events):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class ConsoleSink(Sink):
+
+    def __init__(self, stream=None):
+        """
+        按原有格式输出到控制台
+        :param stream: 输出流，默认sys.stdout
+        """
+        self.stream = stream
+
+    def emitBatch(self, events):
+        lines = []
+        for event in events:
+            try:
+                text = event.format()
+            except Exception as err:
+                print("【X】Event format error: ", err)
+                continue
+            if text:
+                lines.append(text)
+        if not lines:
+            return
+        stream = self.stream or sys.stdout
+        # 一批事件只写一次
+        stream.write('\n'.join(lines) + '\n')
+
+    def flush(self):
+        (self.stream or sys.stdout).flush()
+
+
+class CallbackSink(Sink):
+
+    def __init__(self, callback, batch=False):
+        """
+        事件回调
+        :param callback: 回调函数
+        :param batch: 为True时callback接收事件列表，否则逐个事件调用
+        """
+        self.callback = callback
+        self.batch = batch
+
+    def emitBatch(self, events):
+        if self.batch:
+            self.callback(events)
+        else:
+            for event in events:
+                self.callback(event)
+
+
+class QueueSink(Sink):
+
+    def __init__(self, queue, batch=False, block=True):
+        """
+        把事件放入队列，供其他线程消费
+        :param queue: queue.Queue、multiprocessing.Queue等有put方法的队列
+        :param batch: 为True时以事件列表为单位放入
+        :param block: 队列满时是否阻塞，不阻塞时丢弃并计数
+        """
+        self.queue = queue
+        self.batch = batch
+        self.block = block
+        self.dropped = 0
+
+    def emitBatch(self, events):
+        items = [list(events)] if self.batch else events
+        for item in items:
+            try:
+                self.queue.put(item, self.block)
+            except Exception:
+                self.dropped += len(item) if self.batch else 1
+
+
+class BatchingSink(Sink):
+
+    def __init__(self, sink, max_batch=256, max_delay=0.2):
+        """
+        攒批输出：事件先缓存，满max_batch条或距上次输出超过max_delay秒时统一交给下游sink
+        :param sink: 下游sink
+        :param max_batch: 每批最多事件数
+        :param max_delay: 事件最长缓存时间（秒）
+        """
+        self.sink = sink
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # 下游出错的批次中的事件数，出错前的部分事件可能已经输出
+        self.dropped = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        # 保证下游按事件顺序收到每一批
+        self._emit_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._flushLoop, name='sink-batch', daemon=True)
+        self._thread.start()
+
+    def emit(self, event):
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) < self.max_batch:
+                return
+        self._drain()
+
+    def emitBatch(self, events):
+        with self._lock:
+            self._buffer.extend(events)
+            if len(self._buffer) < self.max_batch:
+                return
+        self._drain()
+
+    def flush(self):
+        self._drain()
+        self.sink.flush()
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        self._drain()
+        self.sink.close()
+
+    def _drain(self):
+        with self._emit_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            for start in range(0, len(events), self.max_batch):
+                batch = events[start:start + self.max_batch]
+                try:
+                    self.sink.emitBatch(batch)
+                except Exception as err:
+                    # 下游可能已输出了出错前的部分事件，不重试，避免重复输出
+                    self.dropped += len(batch)
+                    print("【X】Sink emit error: ", err)
+
+    def _flushLoop(self):
+        while not self._closed.wait(self.max_delay):
+            if self._buffer:
+                self._drain()
@@ -0,0 +1,315 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    supervisor.py
+# @Time:        2025/3/2 16:08
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+多进程抓取：单个进程的解压、protobuf解析受GIL限制，Supervisor启动N个工作进程，
+按一致性哈希把直播间分配到各进程（每个进程内是一个asyncLiveMan.RoomPool），
+各进程的事件经multiprocessing队列汇总后交给主进程的sinks，工作进程退出时自动重启或把其直播间迁移到其他进程：
+    python supervisor.py 261378947940 243749493750 --workers 4
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from events import ControlEvent
+from sinks import BatchingSink, ConsoleSink, QueueSink
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+
+    def __init__(self, nodes=(), replicas=64):
+        """
+        一致性哈希环，增删节点时只有该节点上的键会迁移
+        :param replicas: 每个节点的虚拟节点数
+        """
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        for i in range(self.replicas):
+            key = _hash(f"{node}#{i}")
+            if key not in self._nodes:
+                bisect.insort(self._keys, key)
+            self._nodes[key] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            key = _hash(f"{node}#{i}")
+            if self._nodes.get(key) == node:
+                del self._nodes[key]
+                self._keys.remove(key)
+
+    def node(self, key):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+    def nodes(self):
+        return set(self._nodes.values())
+
+
+def _workerMain(commands, events, fetcher_kwargs, max_batch, max_delay):
+    """
+    工作进程：在一个事件循环上运行分配到的直播间，事件攒批后放入汇总队列
+    """
+    # 在子进程中导入，避免主进程加载aiohttp等依赖
+    from asyncLiveMan import RoomPool
+
+    sink = BatchingSink(QueueSink(events, batch=True), max_batch, max_delay)
+    pool = RoomPool(sinks=[sink], **fetcher_kwargs)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        def readCommands():
+            while True:
+                command, live_id = commands.get()
+                if command == 'add':
+                    loop.call_soon_threadsafe(pool.add, live_id)
+                elif command == 'remove':
+                    loop.call_soon_threadsafe(pool.remove, live_id)
+                else:
+                    loop.call_soon_threadsafe(pool.stop)
+                    return
+
+        threading.Thread(target=readCommands, name='supervisor-commands', daemon=True).start()
+        await pool.run()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+
+
+class _Worker:
+
+    def __init__(self, name, process, commands):
+        self.name = name
+        self.process = process
+        self.commands = commands
+        self.restarts = 0
+
+
+class Supervisor:
+
+    def __init__(self, live_ids=(), workers=None, sinks=None, restart=True, max_restarts=5, replicas=64,
+                 max_batch=256, max_delay=0.2, **fetcher_kwargs):
+        """
+        :param live_ids: 初始的直播间id列表
+        :param workers: 工作进程数，默认为CPU核数
+        :param sinks: 主进程中接收所有直播间事件的sink列表，默认输出到控制台
+        :param restart: 工作进程意外退出时是否重启，不重启或超过max_restarts次时把其直播间迁移到其他进程
+        :param replicas: 一致性哈希的虚拟节点数
+        :param max_batch: 工作进程每批发送的最大事件数
+        :param max_delay: 工作进程中事件最长缓存时间（秒）
+        :param fetcher_kwargs: 传给各进程RoomPool的参数，如methods、fetcher_cls，需可pickle；
+                               decoder固定为'fast'，betterproto结构体pickle后未读取过的字段会变成无效的占位对象，
+                               fast后端的结构体可以完整地传回主进程
+        """
+        if fetcher_kwargs.setdefault('decoder', 'fast') != 'fast':
+            raise ValueError(f"Supervisor requires decoder='fast', got {fetcher_kwargs['decoder']!r}: "
+                             f"betterproto messages lose unset fields when pickled to the main process")
+        self.worker_count = workers or os.cpu_count() or 1
+        self.sinks = list(sinks) if sinks is not None else [ConsoleSink()]
+        self.restart = restart
+        self.max_restarts = max_restarts
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.fetcher_kwargs = fetcher_kwargs
+        self.ring = HashRing(replicas=replicas)
+        # live_id -> 工作进程名
+        self.assignments = {}
+        self.events = 0
+        self.ended = 0
+        self._rooms = list(live_ids)
+        self._workers = {}
+        # spawn在各平台上行为一致，也不会继承主进程中的线程与锁
+        self._context = multiprocessing.get_context('spawn')
+        self._queue = self._context.Queue()
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+
+    def _spawn(self, name):
+        commands = self._context.Queue()
+        process = self._context.Process(target=_workerMain, name=name, daemon=True,
+                                        args=(commands, self._queue, self.fetcher_kwargs, self.max_batch,
+                                              self.max_delay))
+        process.start()
+        return process, commands
+
+    def start(self):
+        """
+        启动工作进程并分配初始的直播间
+        """
+        with self._lock:
+            for i in range(self.worker_count):
+                name = f"worker-{i}"
+                self._workers[name] = _Worker(name, *self._spawn(name))
+                self.ring.add(name)
+            for live_id in self._rooms:
+                self.add(live_id)
+            self._rooms = []
+
+    def add(self, live_id):
+        """
+        添加直播间，分配给哈希环上对应的工作进程
+        """
+        with self._lock:
+            if not self._workers:
+                self._rooms.append(live_id)
+                return
+            if live_id in self.assignments:
+                return
+            name = self.ring.node(live_id)
+            self.assignments[live_id] = name
+            self._workers[name].commands.put(('add', live_id))
+
+    def remove(self, live_id):
+        with self._lock:
+            name = self.assignments.pop(live_id, None)
+            if name is not None and name in self._workers:
+                self._workers[name].commands.put(('remove', live_id))
+
+    def rooms(self):
+        """
+        :return: {工作进程名: [live_id]}
+        """
+        with self._lock:
+            rooms = {name: [] for name in self._workers}
+            for live_id, name in self.assignments.items():
+                rooms.setdefault(name, []).append(live_id)
+            return rooms
+
+    def run(self):
+        """
+        启动并汇总各进程的事件，直到调用stop()
+        """
+        if not self._workers:
+            self.start()
+        last_check = time.monotonic()
+        try:
+            while not self._stopped.is_set():
+                try:
+                    batch = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    batch = None
+                if batch:
+                    self._deliver(batch)
+                if time.monotonic() - last_check >= 1:
+                    last_check = time.monotonic()
+                    self._checkWorkers()
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _deliver(self, batch):
+        self.events += len(batch)
+        for event in batch:
+            # 直播结束的直播间从分配表中移除，工作进程中的抓取对象会自行退出
+            if type(event) is ControlEvent and event.status == 3:
+                with self._lock:
+                    if self.assignments.pop(event.live_id, None) is not None:
+                        self.ended += 1
+        for sink in self.sinks:
+            try:
+                sink.emitBatch(batch)
+            except Exception as err:
+                print("【X】Sink emit error: ", err)
+
+    def _checkWorkers(self):
+        with self._lock:
+            for name, worker in list(self._workers.items()):
+                if worker.process.is_alive():
+                    continue
+                print(f"【!】{name} exited with code {worker.process.exitcode}")
+                rooms = [live_id for live_id, assigned in self.assignments.items() if assigned == name]
+                if self.restart and worker.restarts < self.max_restarts:
+                    worker.process, worker.commands = self._spawn(name)
+                    worker.restarts += 1
+                    for live_id in rooms:
+                        worker.commands.put(('add', live_id))
+                    continue
+                # 从哈希环上移除，只有该进程上的直播间会迁移到其他进程
+                del self._workers[name]
+                self.ring.remove(name)
+                for live_id in rooms:
+                    del self.assignments[live_id]
+                if not self._workers:
+                    print("【X】No worker left")
+                    self._rooms.extend(rooms)
+                    self._stopped.set()
+                    return
+                for live_id in rooms:
+                    self.add(live_id)
+
+    def _shutdown(self):
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.commands.put(('stop', None))
+        deadline = time.monotonic() + 10
+        for worker in workers:
+            while worker.process.is_alive() and time.monotonic() < deadline:
+                self._drain(0.1)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._drain(0)
+        for sink in self.sinks:
+            sink.flush()
+
+    def _drain(self, timeout):
+        while True:
+            try:
+                batch = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if batch:
+                self._deliver(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": {name: {"pid": worker.process.pid, "alive": worker.process.is_alive(),
+                                   "restarts": worker.restarts}
+                            for name, worker in self._workers.items()},
+                "rooms": len(self.assignments),
+                "ended": self.ended,
+                "events": self.events,
+            }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="fetch many live rooms across worker processes")
+    parser.add_argument("live_ids", nargs="+")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核数")
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.live_ids, workers=args.workers)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        supervisor.stop()
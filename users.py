@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# coding:utf-8
+
+# @FileName:    users.py
+# @Time:        2025/2/12 21:06
+# @Author:      bubu
+# @Project:     douyinLiveWebFetcher
+
+"""
+观众信息驻留表：热门直播间里同一批观众会反复出现在聊天、礼物、点赞、进场消息中，
+每条消息都带着完整的User（头像、等级、粉丝团、徽章等），开启后事件中的user改为共用的精简记录，
+完整User只在关键信息变化时才替换保存：
+    DouyinLiveWebFetcher(live_id, user_table=UserTable(maxsize=200000)).start()
+"""
+
+import threading
+from collections import OrderedDict
+
+
+# 变化时需要替换保存完整User的嵌套字段
+_DETAIL_FIELDS = ('avatar_thumb', 'pay_grade', 'fans_club')
+
+
+def userFingerprint(user):
+    """
+    观众关键信息的指纹，用于判断是否需要更新记录。
+    fast后端解析的User中嵌套结构体尚未解析时直接用原始bytes计算，不触发解析
+    """
+    lazy = user.__dict__.get('_lazy')
+    if lazy is not None and all(name in lazy for name in _DETAIL_FIELDS):
+        detail = tuple(lazy[name] for name in _DETAIL_FIELDS)
+    else:
+        url_list = user.avatar_thumb.url_list_list
+        fans_club = user.fans_club.data
+        detail = (url_list[0] if url_list else '', user.pay_grade.level, fans_club.club_name, fans_club.level)
+    return hash((user.nick_name, user.gender, user.level, user.display_id, detail))
+
+
+class InternedUser:
+    """
+    精简的观众记录，同一个User.id在表中只有一份。
+    未列出的属性从detail（最近一次变化时的完整User）中读取
+    """
+    __slots__ = ('id', 'short_id', 'display_id', 'sec_uid', 'nick_name', 'gender', 'level', 'avatar_url',
+                 'pay_grade_level', 'fans_club_name', 'fans_club_level', 'detail', 'fingerprint', 'seen', 'version')
+
+    def __init__(self, user, keep_detail=True, fingerprint=None):
+        self.id = user.id
+        self.seen = 1
+        self.version = 1
+        self._update(user, keep_detail, fingerprint)
+
+    def _update(self, user, keep_detail, fingerprint):
+        self.fingerprint = fingerprint
+        self.short_id = user.short_id
+        self.display_id = user.display_id
+        self.sec_uid = user.sec_uid
+        self.nick_name = user.nick_name
+        self.gender = user.gender
+        self.level = user.level
+        url_list = user.avatar_thumb.url_list_list
+        self.avatar_url = url_list[0] if url_list else ''
+        self.pay_grade_level = user.pay_grade.level
+        fans_club = user.fans_club.data
+        self.fans_club_name = fans_club.club_name
+        self.fans_club_level = fans_club.level
+        self.detail = user if keep_detail else None
+
+    def __getattr__(self, name):
+        # 只有__slots__中没有的属性才会调用到这里
+        detail = object.__getattribute__(self, 'detail')
+        if detail is None:
+            raise AttributeError(f"'InternedUser' object has no attribute {name!r}")
+        return getattr(detail, name)
+
+    def __repr__(self):
+        return (f"InternedUser(id={self.id}, nick_name={self.nick_name!r}, gender={self.gender}, "
+                f"level={self.level}, pay_grade_level={self.pay_grade_level}, "
+                f"fans_club_level={self.fans_club_level})")
+
+
+class UserTable:
+
+    def __init__(self, maxsize=100000, keep_detail=True):
+        """
+        以User.id为键的有界观众表，超出maxsize时淘汰最久未出现的观众
+        :param maxsize: 最多保留的观众数
+        :param keep_detail: 是否保存完整User供InternedUser.detail访问，关闭后只保留精简字段，内存最省
+        """
+        self.maxsize = maxsize
+        self.keep_detail = keep_detail
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self.evictions = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def intern(self, user):
+        """
+        :param user: 消息中的User
+        :return: 表中该观众的InternedUser，关键信息变化时就地更新
+        """
+        user_id = user.id
+        if not user_id:
+            return InternedUser(user, self.keep_detail)
+        fingerprint = userFingerprint(user)
+        with self._lock:
+            record = self._users.get(user_id)
+            if record is None:
+                record = self._users[user_id] = InternedUser(user, self.keep_detail, fingerprint)
+                self.misses += 1
+                while len(self._users) > self.maxsize:
+                    self._users.popitem(last=False)
+                    self.evictions += 1
+                return record
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            record.seen += 1
+            if record.fingerprint != fingerprint:
+                record._update(user, self.keep_detail, fingerprint)
+                record.version += 1
+                self.updates += 1
+        return record
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def __len__(self):
+        return len(self._users)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "updates": self.updates,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }